@@ -0,0 +1,176 @@
+from time import time
+import threading
+import sys
+
+PY3 = sys.version_info.major >= 3
+
+if PY3:
+    import queue
+    from urllib.parse import urlparse
+else:
+    import Queue as queue
+    from urlparse import urlparse
+
+def url_host(url):
+    """ Host part of a stream URL, livestreamer also accepts URLs without a scheme """
+    if '://' not in url:
+        url = 'http://' + url
+    return urlparse(url).netloc.lower()
+
+class CircuitBreaker(object):
+    """ Skip checks to a host after too many consecutive failures
+
+    After threshold consecutive failures the breaker opens for the host and
+    checks are skipped for cooldown seconds. Then a single check is let
+    through: a success closes the breaker, a failure opens it again.
+
+    """
+
+    def __init__(self, threshold=3, cooldown=300):
+        """ threshold : consecutive failures before skipping a host, 0 to disable
+        cooldown  : seconds to wait before trying a failing host again """
+        self.threshold = threshold
+        self.cooldown  = cooldown
+        self.hosts     = {} # host -> [consecutive failures, last reason, opened at]
+        self.lock      = threading.Lock()
+
+    def allow(self, host):
+        """ Returns (allowed, reason), reason explaining why a check is skipped """
+        if self.threshold <= 0:
+            return True, None
+        with self.lock:
+            h = self.hosts.get(host)
+            if not h or h[0] < self.threshold:
+                return True, None
+            if time() - h[2] >= self.cooldown:
+                # Half open: let this one through, further checks wait for it
+                h[2] = time()
+                return True, None
+            return False, '{0} failures on {1}, last: {2}'.format(h[0], host, h[1])
+
+    def success(self, host):
+        with self.lock:
+            self.hosts.pop(host, None)
+
+    def failure(self, host, reason):
+        with self.lock:
+            h = self.hosts.setdefault(host, [0, None, 0])
+            h[0] += 1
+            h[1] = reason
+            if h[0] >= self.threshold:
+                h[2] = time()
+
+    def open_hosts(self):
+        """ Dict of the hosts currently skipped, with the reason """
+        with self.lock:
+            return dict((host, h[1]) for host, h in self.hosts.items()
+                        if self.threshold > 0 and h[0] >= self.threshold)
+
+class CheckSweep(object):
+    """ Run online checks in worker threads, each with a hard deadline
+
+    A check that exceeds its deadline is reported as failed right away and
+    its worker is abandoned: a fresh worker takes its place, so a hung host
+    only costs its own deadline and never stalls the rest of the sweep.
+    The main thread calls poll() to collect results as they come.
+
+    """
+
+    def __init__(self, check, jobs, workers, timeout, breaker=None):
+        """ Start a sweep
+
+        check   : callable(url) returning (status, reason, data), data
+                  being anything the caller wants back, None if the check
+                  failed
+        jobs    : list of (key, url), key is handed back with the results
+        workers : number of worker threads
+        timeout : seconds after which a check is given up, 0 for no deadline
+        breaker : optional CircuitBreaker
+
+        """
+        self.check     = check
+        self.jobs      = jobs
+        self.timeout   = timeout
+        self.breaker   = breaker or CircuitBreaker(0)
+        self.cancelled = False
+        self.n_done    = 0
+
+        self.todo    = queue.Queue()
+        self.results = queue.Queue()
+        self.running = {} # job index -> start time
+        self.lock    = threading.Lock()
+
+        for i in range(len(jobs)):
+            self.todo.put(i)
+        for _ in range(min(workers, len(jobs))):
+            self._spawn()
+
+    def _spawn(self):
+        t = threading.Thread(target=self._work)
+        # Abandoned workers must not keep the program alive
+        t.daemon = True
+        t.start()
+
+    def _work(self):
+        while not self.cancelled:
+            try:
+                i = self.todo.get_nowait()
+            except queue.Empty:
+                return
+            url = self.jobs[i][1]
+            try:
+                host = url_host(url)
+            except ValueError as e:
+                self.results.put((i, 3, 'invalid URL: {0}'.format(e), None))
+                continue
+            allowed, reason = self.breaker.allow(host)
+            if not allowed:
+                self.results.put((i, 2, 'skipped, ' + reason, None))
+                continue
+            with self.lock:
+                self.running[i] = time()
+            try:
+                status, reason, data = self.check(url)
+            except Exception as e:
+                status, reason, data = 3, repr(e), None
+            with self.lock:
+                if self.running.pop(i, None) is None:
+                    # Timed out or cancelled meanwhile, a replacement
+                    # worker has already been started
+                    return
+            if status == 3:
+                self.breaker.failure(host, reason)
+            else:
+                self.breaker.success(host)
+            self.results.put((i, status, reason, data))
+
+    @property
+    def done(self):
+        return self.cancelled or self.n_done == len(self.jobs)
+
+    def cancel(self):
+        """ Stop the sweep, checks in progress are abandoned """
+        self.cancelled = True
+        with self.lock:
+            self.running.clear()
+
+    def poll(self):
+        """ Returns the list of (key, status, reason, data) completed since the last call """
+        finished = []
+        if self.timeout > 0:
+            now = time()
+            with self.lock:
+                for i, started in list(self.running.items()):
+                    if now - started > self.timeout:
+                        del self.running[i]
+                        reason = 'timed out after {0}s'.format(self.timeout)
+                        self.breaker.failure(url_host(self.jobs[i][1]), reason)
+                        finished.append((i, 3, reason, None))
+                        self._spawn()
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                break
+        self.n_done += len(finished)
+        return [(self.jobs[i][0], status, reason, data) for i, status, reason, data in finished]
@@ -0,0 +1,250 @@
+from collections import deque
+from time import time
+import multiprocessing
+import warnings
+import signal
+import os
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from .checker import CircuitBreaker, url_host
+
+if hasattr(multiprocessing, 'get_context'):
+    # The check callable is inherited by the workers rather than pickled
+    mp = multiprocessing.get_context('fork')
+else:
+    mp = multiprocessing
+
+def max_rss():
+    """ Peak resident memory of the current process in KiB, 0 if unknown """
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def current_rss():
+    """ Resident memory of the current process in KiB, falling back on the
+    peak where /proc is not available """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (IOError, OSError, ValueError, IndexError):
+        return max_rss()
+    return pages * (os.sysconf('SC_PAGE_SIZE') // 1024)
+
+def _work(conn, check):
+    """ Worker process main loop: run the checks received on conn """
+    # The terminal belongs to the UI
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGWINCH, signal.SIG_DFL)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    # A forked worker starts with the memory of the UI process, only what
+    # the checks add on top of it counts against the limit
+    start_rss = current_rss()
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, IOError):
+            return
+        if job is None:
+            return
+        i, url = job
+        try:
+            status, reason, data = check(url)
+        except Exception as e:
+            status, reason, data = 3, repr(e), None
+        conn.send((i, status, reason, data, current_rss() - start_rss))
+
+class Worker(object):
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn    = conn
+        self.checks  = 0
+        # Sweep, job index and start time of the check in progress
+        self.sweep   = None
+        self.job     = None
+        self.started = None
+
+class CheckPool(object):
+    """ Worker processes running online checks out of the UI process
+
+    Plugins then run in parallel on several cores without contending with
+    the curses loop for the GIL, and whatever memory they leak goes away
+    with the worker: a worker is replaced after max_checks checks, or once
+    its resident memory grew by more than max_rss MiB since it started.
+
+    Checks are submitted through sweeps, see sweep(). Workers are started
+    as needed and kept between sweeps.
+
+    """
+
+    def __init__(self, check, workers=4, max_checks=200, max_rss=200):
+        """ check : callable(url) returning (status, reason, data) as for
+                CheckSweep, called in the workers """
+        self.check      = check
+        self.size       = workers
+        self.max_checks = max_checks
+        self.max_rss    = max_rss
+        self.workers    = []
+        # Stopped workers not reaped yet
+        self.retired    = []
+
+    def sweep(self, jobs, timeout, breaker=None):
+        """ Start checking jobs, a list of (key, url), see PoolSweep """
+        return PoolSweep(self, jobs, timeout, breaker)
+
+    def _spawn(self):
+        conn, child_conn = mp.Pipe()
+        p = mp.Process(target=_work, args=(child_conn, self.check))
+        p.daemon = True
+        with warnings.catch_warnings():
+            # Forking with threads around is fine here, the worker only
+            # runs the check
+            warnings.simplefilter('ignore', DeprecationWarning)
+            p.start()
+        child_conn.close()
+        w = Worker(p, conn)
+        self.workers.append(w)
+        return w
+
+    def _retire(self, w, kill=False):
+        """ Stop a worker, at once if kill is set, else after its current check """
+        self.workers.remove(w)
+        try:
+            if kill:
+                w.process.terminate()
+            else:
+                w.conn.send(None)
+        except (IOError, OSError):
+            pass
+        w.conn.close()
+        self.retired.append(w.process)
+
+    def _reap(self):
+        for p in list(self.retired):
+            if not p.is_alive():
+                p.join()
+                self.retired.remove(p)
+
+    def idle_worker(self):
+        """ An idle worker, started if needed, None if all of them are busy """
+        for w in self.workers:
+            if w.sweep is None:
+                return w
+        if len(self.workers) < self.size:
+            return self._spawn()
+        return None
+
+    def collect(self):
+        """ Hand the results ready in the pipes over to their sweeps """
+        self._reap()
+        for w in list(self.workers):
+            if w.sweep is None or not w.conn.poll():
+                continue
+            sweep, i = w.sweep, w.job
+            w.sweep = w.job = None
+            try:
+                _, status, reason, data, grown = w.conn.recv()
+            except (EOFError, IOError):
+                self._retire(w, kill=True)
+                sweep._done(i, 3, 'check worker died')
+                continue
+            sweep._done(i, status, reason, data)
+            w.checks += 1
+            if (w.checks >= self.max_checks or len(self.workers) > self.size
+                or (self.max_rss and grown > self.max_rss*1024)):
+                self._retire(w)
+
+    def close(self):
+        for w in list(self.workers):
+            self._retire(w, kill=w.sweep is not None)
+        for p in self.retired:
+            p.join(1)
+        self.retired = []
+
+class PoolSweep(object):
+    """ A sweep of checks run by a CheckPool, polled like checker.CheckSweep
+
+    A check that exceeds its deadline is reported as failed and its worker
+    is killed, a fresh one is started when needed.
+
+    """
+
+    def __init__(self, pool, jobs, timeout, breaker=None):
+        self.pool      = pool
+        self.jobs      = jobs
+        self.timeout   = timeout
+        self.breaker   = breaker or CircuitBreaker(0)
+        self.cancelled = False
+        self.n_done    = 0
+
+        self.todo    = deque(range(len(jobs)))
+        self.results = []
+
+    def _done(self, i, status, reason, data=None):
+        # Only dispatched jobs get here, their URL was parsed already
+        host = url_host(self.jobs[i][1])
+        if status == 3:
+            self.breaker.failure(host, reason)
+        else:
+            self.breaker.success(host)
+        self.results.append((i, status, reason, data))
+
+    def _dispatch(self):
+        while self.todo:
+            w = self.pool.idle_worker()
+            if w is None:
+                return
+            i = self.todo.popleft()
+            url = self.jobs[i][1]
+            try:
+                host = url_host(url)
+            except ValueError as e:
+                self.results.append((i, 3, 'invalid URL: {0}'.format(e), None))
+                continue
+            allowed, reason = self.breaker.allow(host)
+            if not allowed:
+                self.results.append((i, 2, 'skipped, ' + reason, None))
+                continue
+            try:
+                w.conn.send((i, url))
+            except (IOError, OSError):
+                self.pool._retire(w, kill=True)
+                self.todo.appendleft(i)
+                continue
+            w.sweep   = self
+            w.job     = i
+            w.started = time()
+
+    @property
+    def done(self):
+        return self.cancelled or self.n_done == len(self.jobs)
+
+    def cancel(self):
+        """ Stop the sweep, the workers busy with it are killed """
+        self.cancelled = True
+        self.todo.clear()
+        for w in list(self.pool.workers):
+            if w.sweep is self:
+                self.pool._retire(w, kill=True)
+
+    def poll(self):
+        """ Returns the list of (key, status, reason, data) completed since the last call """
+        if self.cancelled:
+            return []
+        self.pool.collect()
+        if self.timeout > 0:
+            now = time()
+            for w in list(self.pool.workers):
+                if w.sweep is self and now - w.started > self.timeout:
+                    i = w.job
+                    self.pool._retire(w, kill=True)
+                    self._done(i, 3, 'timed out after {0}s'.format(self.timeout))
+        self._dispatch()
+        finished, self.results = self.results, []
+        self.n_done += len(finished)
+        return [(self.jobs[i][0], status, reason, data) for i, status, reason, data in finished]
@@ -1,3 +1,4 @@
+import copy
 import os
 
 VERSION="1.5.2"
@@ -7,9 +8,30 @@ DEFAULT_RESOLUTION = 'Medium'
 CHECK_ONLINE_ON_START = False
 CHECK_ONLINE_THREADS = 15
 CHECK_ONLINE_INTERVAL = 0
+CHECK_ONLINE_TIMEOUT = 20
+CHECK_ONLINE_BREAKER_THRESHOLD = 3
+CHECK_ONLINE_BREAKER_COOLDOWN = 300
+CHECK_ONLINE_GROUP_INTERVALS = {}
+CHECK_ONLINE_BACKEND = 'threads'
+CHECK_ONLINE_PROCESSES = 4
+CHECK_ONLINE_WORKER_MAX_CHECKS = 200
+CHECK_ONLINE_WORKER_MAX_RSS = 200
+
+PLAYER_TERMINATE_GRACE = 5
+PLAYER_RESTART_DELAY = 5
+PLAYER_RESTART_MAX_DELAY = 300
+PLAYER_RESTART_BUDGET = 5
+PLAYER_RESTART_WINDOW = 3600
 
 LIVESTREAMER_COMMANDS = ["livestreamer"]
 
+CONTROL_SOCKET = None
+STATUS_TABLE = None
+
+HISTORY_ENABLED = True
+HISTORY_MAX_SIZE = 1024*1024
+HISTORY_BACKUPS = 3
+
 RC_DEFAULT_DIR  = (os.environ.get('XDG_CONFIG_HOME') or
                   os.path.expanduser(u'~/.config/livestreamer-curses'))
 RC_DEFAULT_PATH = os.path.join(RC_DEFAULT_DIR, u'livestreamer-cursesrc')
@@ -24,3 +46,19 @@ INDICATORS = [
         '  !  ', # error
         '[>>>]'  # playing
 ]
+
+# Snapshot of the defaults above, rc files are applied on top of it
+DEFAULTS = dict((k, v) for k, v in globals().items() if k.isupper())
+
+def load_rc(filename):
+    """ Return a new config module: the defaults overridden by the rc file """
+    import types
+    rc = types.ModuleType(__name__)
+    # Copies, so that rc files editing a default in place do not change it
+    # for the next reload
+    rc.__dict__.update(copy.deepcopy(DEFAULTS))
+    rc.__file__ = filename
+    with open(filename) as f:
+        code = compile(f.read(), filename, 'exec')
+    exec(code, rc.__dict__)
+    return rc
@@ -0,0 +1,151 @@
+import socket
+import json
+import os
+
+class ControlError(Exception): pass
+
+class ControlServer(object):
+    """ Serve line-delimited JSON requests over a Unix domain socket
+
+    Nothing here blocks on its own: the sockets returned by get_sockets()
+    are meant to be watched by the main select() loop along with stdin and
+    the players' output, and handle() is called for the ones that are ready.
+
+    A request is a JSON object on a single line:
+        {"id": 1, "method": "play", "params": {"id": 12}}
+    and the answer is written back on a single line as well:
+        {"id": 1, "result": ...}  or  {"id": 1, "error": "..."}
+
+    """
+
+    # At most this many requests are served per client on each wakeup, the
+    # rest stays buffered until the next loop iteration so that a burst of
+    # requests cannot starve the keyboard
+    MAX_REQUESTS_PER_WAKEUP = 4
+    MAX_LINE_LENGTH         = 65536
+    RECV_SIZE               = 4096
+
+    def __init__(self, path, dispatch):
+        """ Create the socket and start listening
+
+        path     : filesystem path of the socket
+        dispatch : callable(method, params) returning a JSON serializable
+                   result, or raising ControlError
+
+        """
+        self.path     = path
+        self.dispatch = dispatch
+        self.clients  = {}
+
+        if os.path.exists(path):
+            # Refuse to steal the socket from a live instance
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+            except socket.error:
+                os.unlink(path)
+            else:
+                raise ControlError('Control socket {0} is already in use'.format(path))
+            finally:
+                probe.close()
+        sock_dir = os.path.dirname(path)
+        if sock_dir and not os.path.exists(sock_dir):
+            os.makedirs(sock_dir)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        os.chmod(path, 0o600)
+        self.sock.listen(5)
+        self.sock.setblocking(False)
+
+    def close(self):
+        for c in list(self.clients):
+            self.drop(c)
+        self.sock.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def get_sockets(self):
+        """ Sockets to watch for reading """
+        return [self.sock] + list(self.clients)
+
+    def owns(self, fd):
+        return fd is self.sock or fd in self.clients
+
+    def has_pending(self):
+        """ Whether complete requests are buffered, the caller should not
+        sleep in select() if so """
+        for buf in self.clients.values():
+            if b'\n' in buf:
+                return True
+        return False
+
+    def drop(self, conn):
+        self.clients.pop(conn, None)
+        try:
+            conn.close()
+        except socket.error:
+            pass
+
+    def handle(self, fd):
+        """ Called when fd is ready for reading """
+        if fd is self.sock:
+            try:
+                conn = self.sock.accept()[0]
+            except socket.error:
+                return
+            # Reads only happen after select(), the timeout bounds writes to
+            # a client that does not read its answers
+            conn.settimeout(1)
+            self.clients[conn] = b''
+            return
+
+        try:
+            data = fd.recv(self.RECV_SIZE)
+        except socket.error:
+            data = b''
+        if not data:
+            self.drop(fd)
+            return
+        buf = self.clients[fd] + data
+        if len(buf) > self.MAX_LINE_LENGTH and b'\n' not in buf:
+            self.drop(fd)
+            return
+        self.clients[fd] = buf
+
+    def process_pending(self):
+        """ Serve buffered requests, at most MAX_REQUESTS_PER_WAKEUP per client """
+        for conn in list(self.clients):
+            for _ in range(self.MAX_REQUESTS_PER_WAKEUP):
+                buf = self.clients.get(conn)
+                if buf is None or b'\n' not in buf:
+                    break
+                line, self.clients[conn] = buf.split(b'\n', 1)
+                if line.strip():
+                    self.serve(conn, line)
+
+    def serve(self, conn, line):
+        req_id = None
+        try:
+            try:
+                req = json.loads(line.decode('utf-8'))
+            except ValueError:
+                raise ControlError('Invalid JSON')
+            if not isinstance(req, dict) or 'method' not in req:
+                raise ControlError('Request must be an object with a "method" key')
+            req_id = req.get('id')
+            params = req.get('params') or {}
+            if not isinstance(params, dict):
+                raise ControlError('"params" must be an object')
+            reply = {'id': req_id, 'result': self.dispatch(req['method'], params)}
+        except ControlError as e:
+            reply = {'id': req_id, 'error': str(e)}
+        except Exception as e:
+            # Malformed parameters must not take the UI down
+            reply = {'id': req_id, 'error': 'Request failed: {0!r}'.format(e)}
+        try:
+            conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+        except socket.error:
+            self.drop(conn)
@@ -0,0 +1,65 @@
+import csv
+import json
+
+from .streamlist import Stream
+from .fuzzy import stream_score
+
+FORMATS = ('json', 'ndjson', 'csv', 'tsv')
+
+def iter_streams(store, query='', hide_offline=False, group=None):
+    """ Yield the streams of store one at a time, with their cached online
+    status and qualities
+
+    query        : keep only streams matching this filter, as in the UI
+    hide_offline : drop streams last seen offline or in error, as in the UI
+                   when offline streams are not shown
+    group        : keep only streams with this tag
+
+    """
+    online = (store.get('online') or {}).get('status', {})
+    qualities = store.get('qualities') or {}
+    query = query.lower()
+    for r in store.iter_records():
+        s = Stream.from_record(r)
+        s.online = online.get(s.id, 2)
+        s.qualities = qualities.get(s.id, ())
+        if group and group not in s.tags:
+            continue
+        if hide_offline and s.online not in [1,2]:
+            continue
+        if query and stream_score(query, s) is None:
+            continue
+        yield s
+
+def export_streams(store, out, fmt='json', fields=None, query='', hide_offline=False, group=None):
+    """ Write the streams of store to out, one record at a time
+
+    fmt    : one of FORMATS
+    fields : list of Stream fields to output, all of them by default
+
+    """
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format: {0}'.format(fmt))
+    fields = fields or list(Stream.FIELDS)
+    for k in fields:
+        if k not in Stream.FIELDS:
+            raise ValueError('Unknown field: {0}, choose among {1}'.format(k, ', '.join(Stream.FIELDS)))
+
+    streams = iter_streams(store, query, hide_offline, group)
+    if fmt in ('csv', 'tsv'):
+        writer = csv.writer(out, delimiter=',' if fmt == 'csv' else '\t', lineterminator='\n')
+        writer.writerow(fields)
+        for s in streams:
+            writer.writerow([' '.join(s[k]) if k in ('tags', 'qualities') else s[k] for k in fields])
+    elif fmt == 'ndjson':
+        for s in streams:
+            out.write(json.dumps(dict((k, s[k]) for k in fields)))
+            out.write('\n')
+    else:
+        out.write('[')
+        sep = ''
+        for s in streams:
+            out.write(sep)
+            out.write(json.dumps(dict((k, s[k]) for k in fields)))
+            sep = ', '
+        out.write(']\n')
@@ -0,0 +1,73 @@
+from math import log
+from time import time
+
+# Characters after which a match counts as the start of a word
+SEPARATORS = ' /._-:?=&'
+
+# A stream watched n times gets VIEWS_WEIGHT*log(1+n) bonus, one watched
+# just now up to RECENT_WEIGHT, fading over RECENT_DAYS
+VIEWS_WEIGHT  = 2
+RECENT_WEIGHT = 6
+RECENT_DAYS   = 7
+
+# Matches in the URL count less than matches in the name
+URL_FACTOR = 0.5
+
+def is_subsequence(query, text):
+    """ Whether the characters of query appear in text, in order """
+    i = 0
+    for c in query:
+        i = text.find(c, i)
+        if i < 0:
+            return False
+        i += 1
+    return True
+
+def fuzzy_score(query, text):
+    """ Score how well query matches text, None if it does not match at all
+
+    Both are expected lower case. A contiguous match beats a scattered one,
+    matches at word starts and early in text are preferred.
+
+    """
+    if not query:
+        return 0
+    pos = text.find(query)
+    if pos >= 0:
+        score = 10*len(query) + 20
+        if pos == 0 or text[pos-1] in SEPARATORS:
+            score += 10
+        return score - min(pos, 10)
+    score = 0
+    prev = -2
+    i = 0
+    for c in query:
+        i = text.find(c, i)
+        if i < 0:
+            return None
+        if i == prev + 1:
+            score += 8
+        elif i == 0 or text[i-1] in SEPARATORS:
+            score += 6
+        else:
+            score += 2 - min(i - prev, 4)/2.0
+        prev = i
+        i += 1
+    return score
+
+def stream_score(query, stream, now=None):
+    """ Rank a stream for query, None if it does not match
+
+    Match quality comes first, view count and recency break near-ties.
+
+    """
+    name_score = fuzzy_score(query, stream.name.lower())
+    url_score  = fuzzy_score(query, stream.url.lower())
+    if name_score is None and url_score is None:
+        return None
+    score = max(name_score or 0, (url_score or 0)*URL_FACTOR)
+    score += VIEWS_WEIGHT*log(1 + stream.seen)
+    if stream.last_seen:
+        days = ((now or time()) - stream.last_seen)/86400.0
+        score += RECENT_WEIGHT*max(0, 1 - days/RECENT_DAYS)
+    return score
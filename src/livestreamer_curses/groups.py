@@ -0,0 +1,52 @@
+import re
+
+def parse_tags(text):
+    """ Sorted tuple of the distinct tags in text, separated by spaces or commas """
+    return tuple(sorted(set(t.lower() for t in re.split(r'[\s,]+', text) if t)))
+
+class GroupIndex(object):
+    """ Membership sets of the stream tags, each tag naming a group
+
+    The sets are kept up to date as streams are added, retagged or removed,
+    each change only touching the sets of the tags involved, so that checking
+    a group costs the size of the group rather than a pass over every stream.
+    Shown groups keep the order of the stream list, picked by membership.
+
+    """
+
+    def __init__(self, streams=()):
+        self.members = {} # tag -> set of streams
+        for s in streams:
+            self.add(s)
+
+    def add(self, stream):
+        for t in stream.tags:
+            self.members.setdefault(t, set()).add(stream)
+
+    def remove(self, stream, tags=None):
+        """ Drop stream from the groups of tags, its current ones by default """
+        for t in stream.tags if tags is None else tags:
+            m = self.members.get(t)
+            if m is None:
+                continue
+            m.discard(stream)
+            if not m:
+                del self.members[t]
+
+    def retag(self, stream, old_tags):
+        """ Move stream from the groups of old_tags to those of its current tags """
+        self.remove(stream, old_tags)
+        self.add(stream)
+
+    def get(self, tag):
+        """ Set of the streams in a group, empty if there is no such group """
+        return self.members.get(tag, frozenset())
+
+    def names(self):
+        return sorted(self.members)
+
+    def __contains__(self, tag):
+        return tag in self.members
+
+    def __len__(self):
+        return len(self.members)
@@ -0,0 +1,149 @@
+from time import time, strftime, localtime, mktime
+import fcntl
+import json
+import os
+
+def empty_stats():
+    return {
+        'sessions' : 0,
+        'streams'  : {}, # id -> {'name', 'plays', 'seconds', 'last'}
+        'days'     : {}, # YYYY-MM-DD -> {'plays', 'seconds'}
+        'hours'    : [0]*24 # seconds watched by hour of the day
+    }
+
+def split_by_hour(start, end):
+    """ Yield (local time struct, seconds) for each hour slot between start and end """
+    t = start
+    while t < end:
+        lt = localtime(t)
+        next_hour = mktime(lt[:4] + (0, 0) + lt[6:8] + (-1,)) + 3600
+        slot_end = min(end, max(next_hour, t + 1))
+        yield lt, slot_end - t
+        t = slot_end
+
+class History(object):
+    """ Append-only log of playback events with precomputed rollups
+
+    Each play, stop (terminated from the UI) and exit (the player ended on
+    its own) is appended to an NDJSON file, rotated once it grows over
+    max_size. Rollups per stream, per day and per hour of the day are kept
+    up to date in a small JSON file next to it as sessions start and end,
+    so that statistics never need to scan the log.
+
+    """
+
+    def __init__(self, path, max_size=1024*1024, backups=3):
+        self.path       = path
+        self.stats_path = path + '.stats'
+        self.lock_path  = path + '.lock'
+        self.max_size   = max_size
+        self.backups    = backups
+        # Sessions in progress, stream id -> (start time, name)
+        self.sessions   = {}
+
+    def play(self, stream, pid=None):
+        t = time()
+        self.sessions[stream['id']] = (t, stream['name'])
+        self._record({'t': t, 'event': 'play', 'id': stream['id'],
+                      'name': stream['name'], 'url': stream['url'], 'pid': pid},
+                     self._count_play)
+
+    def stop(self, idf, returncode=None, event='stop'):
+        """ End a session, event is 'stop' or 'exit' """
+        session = self.sessions.pop(idf, None)
+        if not session:
+            return
+        t = time()
+        start, name = session
+        self._record({'t': t, 'event': event, 'id': idf, 'name': name,
+                      'duration': round(t - start, 1), 'returncode': returncode},
+                     lambda stats, e: self._count_session(stats, e, start))
+
+    def read_stats(self):
+        try:
+            with open(self.stats_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return empty_stats()
+
+    def _count_play(self, stats, e):
+        s = stats['streams'].setdefault(str(e['id']), {'plays': 0, 'seconds': 0})
+        s['name']   = e['name']
+        s['plays'] += 1
+        s['last']   = int(e['t'])
+        day = stats['days'].setdefault(strftime('%Y-%m-%d', localtime(e['t'])),
+                                       {'plays': 0, 'seconds': 0})
+        day['plays'] += 1
+
+    def _count_session(self, stats, e, start):
+        stats['sessions'] += 1
+        s = stats['streams'].setdefault(str(e['id']), {'name': e['name'], 'plays': 0})
+        s['seconds'] = s.get('seconds', 0) + int(e['duration'])
+        for lt, seconds in split_by_hour(start, e['t']):
+            day = stats['days'].setdefault(strftime('%Y-%m-%d', lt), {'plays': 0, 'seconds': 0})
+            day['seconds'] += int(seconds)
+            stats['hours'][lt.tm_hour] += int(seconds)
+
+    def _record(self, event, update):
+        # History must never get in the way of playing streams
+        try:
+            lock = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        except EnvironmentError:
+            return
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._rotate()
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(event) + '\n')
+            stats = self.read_stats()
+            update(stats, event)
+            tmp = self.stats_path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(stats, f)
+            os.rename(tmp, self.stats_path)
+        except EnvironmentError:
+            pass
+        finally:
+            os.close(lock)
+
+    def _rotate(self):
+        try:
+            if os.path.getsize(self.path) < self.max_size:
+                return
+        except OSError:
+            return
+        for i in range(self.backups - 1, 0, -1):
+            older = '{0}.{1}'.format(self.path, i)
+            if os.path.exists(older):
+                os.rename(older, '{0}.{1}'.format(self.path, i + 1))
+        if self.backups > 0:
+            os.rename(self.path, self.path + '.1')
+        else:
+            os.unlink(self.path)
+
+def format_duration(seconds):
+    h, m = divmod(int(seconds) // 60, 60)
+    return '{0}h{1:02d}'.format(h, m)
+
+def format_stats(stats, days=7, top=10):
+    """ Human readable summary of the rollups, as a list of lines """
+    lines = ['{0} sessions, {1} watched'.format(
+        stats['sessions'], format_duration(sum(stats['hours'])))]
+
+    lines += ['', 'MOST WATCHED']
+    streams = sorted(stats['streams'].values(), key=lambda s: s.get('seconds', 0), reverse=True)
+    for s in streams[:top]:
+        lines.append('  {0:<22} {1:>8} {2:>5} plays'.format(
+            s['name'][:22], format_duration(s.get('seconds', 0)), s.get('plays', 0)))
+
+    lines += ['', 'LAST {0} DAYS'.format(days)]
+    for day in sorted(stats['days'], reverse=True)[:days]:
+        d = stats['days'][day]
+        lines.append('  {0}  {1:>8} {2:>5} plays'.format(day, format_duration(d['seconds']), d['plays']))
+
+    lines += ['', 'BY HOUR OF THE DAY']
+    peak = max(stats['hours']) or 1
+    for hour, seconds in enumerate(stats['hours']):
+        lines.append('  {0:02d}h {1:>8} {2}'.format(hour, format_duration(seconds),
+                                                    '#' * int(round(30.0 * seconds / peak))))
+    return lines
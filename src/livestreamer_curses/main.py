@@ -26,12 +26,16 @@ import curses
 import argparse
 import sys
 import os
-import imp
 import json
+import errno
 
 from . import config
 
-from .streamlist import StreamList
+from .streamlist import StreamList, ConfigError, import_streams
+from .store import StreamStore, ShelveError
+from .history import History, format_stats
+from .export import export_streams, FORMATS
+from .statustable import StatusTableReader, StatusTableError
 
 def main():
     global config
@@ -47,16 +51,39 @@ def main():
                         default=os.path.join(config.RC_DEFAULT_PATH))
     parser.add_argument('-p', action='store', type=arg_type, metavar='JSON file', help='load (overwrite) database with data from this file. Use - for stdin')
     parser.add_argument('-l', action='store_true', help='print the list of streams and exit')
+    parser.add_argument('--format', choices=FORMATS, default='json', help='output format for -l (default: json)')
+    parser.add_argument('--fields', type=arg_type, metavar='f1,f2,...', help='fields to output with -l')
+    parser.add_argument('--filter', type=arg_type, metavar='query', default='', help='only list streams matching this filter with -l')
+    parser.add_argument('--group', type=arg_type, metavar='tag', help='only list streams of this group with -l')
+    parser.add_argument('--hide-offline', action='store_true', help='with -l, skip streams found offline by the last check')
+    parser.add_argument('--live', action='store_true', help='print the live status published by the running instance (see STATUS_TABLE) and exit')
+    parser.add_argument('--stats', action='store_true', help='print playback statistics and exit')
     args = parser.parse_args()
 
     rc_filename = args.f
     if os.path.exists(rc_filename):
         try:
-            config = imp.load_source(config.__name__, rc_filename)
+            config = config.load_rc(rc_filename)
         except Exception as e:
             sys.stderr.write('Failed to read rc file, error was:\n{0}\n'.format(str(e)))
             sys.exit(1)
 
+    if args.stats:
+        for line in format_stats(History(args.d + '.history').read_stats()):
+            print(line)
+        sys.exit(0)
+
+    if args.live:
+        if not config.STATUS_TABLE:
+            sys.stderr.write('STATUS_TABLE is not set in the rc file\n')
+            sys.exit(1)
+        try:
+            print(json.dumps(StatusTableReader(os.path.expanduser(config.STATUS_TABLE)).read()))
+        except StatusTableError as e:
+            sys.stderr.write('{0}\n'.format(str(e)))
+            sys.exit(1)
+        sys.exit(0)
+
     init_stream_list = []
     if args.p:
         if args.p == '-':
@@ -80,9 +107,32 @@ def main():
             return True
         init_stream_list = list(filter(check_stream, init_stream_list))
 
-    l = StreamList(args.d, config, list_streams=args.l, init_stream_list=init_stream_list)
-    if not args.l:
+    if args.l:
+        store = StreamStore(args.d)
+        fields = args.fields.split(',') if args.fields else None
+        try:
+            if init_stream_list:
+                import_streams(store, init_stream_list)
+            export_streams(store, sys.stdout, args.format, fields, args.filter, args.hide_offline,
+                           args.group and args.group.lower())
+        except (ValueError, ShelveError) as e:
+            sys.stderr.write('{0}\n'.format(str(e)))
+            sys.exit(1)
+        except IOError as e:
+            # Output closed early, e.g. piped to head
+            if e.errno != errno.EPIPE:
+                raise
+        sys.exit(0)
+
+    try:
+        l = StreamList(args.d, config, init_stream_list=init_stream_list, rc_filename=rc_filename)
         curses.wrapper(l)
+    except ConfigError as e:
+        sys.stderr.write('Invalid rc file, error was:\n{0}\n'.format(str(e)))
+        sys.exit(1)
+    except ShelveError as e:
+        sys.stderr.write('{0}\n'.format(str(e)))
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
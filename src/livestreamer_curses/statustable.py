@@ -0,0 +1,235 @@
+from time import time
+import struct
+import errno
+import mmap
+import os
+
+MAGIC   = b'LSCS'
+VERSION = 1
+
+# magic, version, record size, capacity, writer pid, last update
+HEADER = struct.Struct('<4sHHIid')
+PID_OFFSET  = 12
+TIME_OFFSET = 16
+# sequence, stream id, online status, playing, last check, player pid
+RECORD = struct.Struct('<Iqbb2xdi')
+
+# Online status of an unused slot
+FREE = -1
+
+class StatusTableError(Exception): pass
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+class StatusTable(object):
+    """ Publish the status of every stream in a memory mapped file
+
+    The file is a header followed by fixed size records, one per stream,
+    updated in place. Each record starts with a sequence number which is odd
+    while the record is being written, so that readers (see
+    StatusTableReader) never need a lock: they copy a record and try again
+    if the sequence was odd or changed meanwhile.
+
+    When the table is full, a bigger one is written next to it and renamed
+    over it, readers notice the file changed and map the new one.
+
+    """
+
+    def __init__(self, path, capacity=256):
+        self.path     = path
+        self.slots    = {} # stream id -> slot
+        self.free     = [] # unused slots, the lowest last
+        self.status   = {} # stream id -> [online, playing, last check, pid]
+        self.capacity = 0
+        self.map      = None
+
+        table_dir = os.path.dirname(path)
+        if table_dir and not os.path.exists(table_dir):
+            os.makedirs(table_dir)
+        elif os.path.exists(path):
+            # Refuse to take over the table of a live instance
+            try:
+                pid = StatusTableReader(path).header()[1]
+            except StatusTableError:
+                pid = 0
+            if pid and pid != os.getpid() and pid_alive(pid):
+                raise StatusTableError('Status table {0} is used by process {1}'.format(path, pid))
+        self._create(capacity)
+
+    def _create(self, capacity):
+        """ Write a table with room for capacity streams and map it """
+        size = HEADER.size + capacity*RECORD.size
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, os.getpid(), time()))
+            f.write(RECORD.pack(0, 0, FREE, 0, 0, 0) * capacity)
+        fd = os.open(tmp, os.O_RDWR)
+        try:
+            new_map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        os.rename(tmp, self.path)
+        if self.map:
+            self.map.close()
+        self.map = new_map
+        self.free = list(range(capacity-1, self.capacity-1, -1)) + self.free
+        self.capacity = capacity
+        # Streams keep their slots
+        for idf, slot in self.slots.items():
+            self._write(slot, idf)
+
+    def _allocate(self, idf):
+        if not self.free:
+            self._create(self.capacity*2)
+        slot = self.slots[idf] = self.free.pop()
+        return slot
+
+    def _write(self, slot, idf):
+        offset = HEADER.size + slot*RECORD.size
+        seq = struct.unpack_from('<I', self.map, offset)[0]
+        # Odd while writing
+        struct.pack_into('<I', self.map, offset, (seq + 1) & 0xffffffff)
+        if idf is None:
+            RECORD.pack_into(self.map, offset, (seq + 1) & 0xffffffff, 0, FREE, 0, 0, 0)
+        else:
+            online, playing, last_check, pid = self.status[idf]
+            RECORD.pack_into(self.map, offset, (seq + 1) & 0xffffffff, idf, online,
+                             playing, last_check, pid or 0)
+        struct.pack_into('<I', self.map, offset, (seq + 2) & 0xffffffff)
+        struct.pack_into('<d', self.map, TIME_OFFSET, time())
+
+    def update(self, idf, online=None, playing=None, last_check=None, pid=None):
+        """ Change some of the fields of a stream, adding it if needed """
+        if not isinstance(idf, int):
+            # The records only hold integer ids
+            return
+        status = self.status.setdefault(idf, [2, False, 0, 0])
+        if online is not None:
+            status[0] = online
+        if playing is not None:
+            status[1] = playing
+            status[3] = pid if playing else 0
+        if last_check is not None:
+            status[2] = last_check
+        slot = self.slots.get(idf)
+        if slot is None:
+            slot = self._allocate(idf)
+        self._write(slot, idf)
+
+    def remove(self, idf):
+        slot = self.slots.pop(idf, None)
+        self.status.pop(idf, None)
+        if slot is not None:
+            self._write(slot, None)
+            self.free.append(slot)
+
+    def sync(self, streams, playing=()):
+        """ Publish a whole stream list, dropping the streams not in it
+
+        playing : dict of stream id -> pid of the streams being played
+
+        """
+        ids = set()
+        for s in streams:
+            ids.add(s.id)
+            pid = playing.get(s.id) if playing else None
+            self.update(s.id, online=s.online, playing=pid is not None, pid=pid)
+        for idf in list(self.slots):
+            if idf not in ids:
+                self.remove(idf)
+
+    def close(self):
+        """ Tell readers that the writer is gone, the last status is kept """
+        if self.map:
+            struct.pack_into('<i', self.map, PID_OFFSET, 0)
+            self.map.close()
+            self.map = None
+
+class StatusTableReader(object):
+    """ Read only access to a StatusTable, from any process
+
+    Nothing is locked and nothing is parsed but fixed size records, so this
+    can be polled as often as needed.
+
+    """
+
+    # Attempts at reading a record that keeps being rewritten
+    RETRIES = 100
+
+    def __init__(self, path):
+        self.path  = path
+        self.map   = None
+        self.inode = None
+
+    def _open(self):
+        """ Map the table, again if it was replaced by a bigger one """
+        try:
+            inode = os.stat(self.path).st_ino
+        except OSError:
+            raise StatusTableError('No status table at {0}'.format(self.path))
+        if self.map is not None and inode == self.inode:
+            return
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            new_map = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        magic, version, record_size = HEADER.unpack_from(new_map, 0)[:3]
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            new_map.close()
+            raise StatusTableError('{0} is not a status table'.format(self.path))
+        if self.map is not None:
+            self.map.close()
+        self.map = new_map
+        self.inode = inode
+
+    def header(self):
+        """ Returns (capacity, writer pid, last update time), the pid being
+        0 once the writer exited """
+        self._open()
+        return HEADER.unpack_from(self.map, 0)[3:]
+
+    def _read_record(self, slot):
+        offset = HEADER.size + slot*RECORD.size
+        for _ in range(self.RETRIES):
+            seq = struct.unpack_from('<I', self.map, offset)[0]
+            if seq % 2:
+                continue
+            record = RECORD.unpack_from(self.map, offset)
+            if struct.unpack_from('<I', self.map, offset)[0] == seq:
+                return record
+        return None
+
+    def read(self):
+        """ Returns a list of dicts with the status of every stream """
+        streams = []
+        for slot in range(self.header()[0]):
+            record = self._read_record(slot)
+            if record is None or record[2] == FREE:
+                continue
+            seq, idf, online, playing, last_check, pid = record
+            streams.append({
+                'id'         : idf,
+                'online'     : online,
+                'playing'    : bool(playing),
+                'last_check' : last_check,
+                'pid'        : pid or None
+            })
+        return streams
+
+    def get(self, idf):
+        """ Status of a single stream, None if it is not in the table """
+        for s in self.read():
+            if s['id'] == idf:
+                return s
+        return None
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
@@ -0,0 +1,252 @@
+import shelve
+import fcntl
+import os
+
+class ShelveError(Exception): pass
+
+STREAM_PREFIX = 'stream:'
+
+def stream_key(idf):
+    return '{0}{1}'.format(STREAM_PREFIX, idf)
+
+class StreamStore(object):
+    """ Stream database that can be shared between several processes
+
+    The shelve is only opened for the duration of a single read or write,
+    under a lock file: readers take a shared lock, writers an exclusive one.
+    Any number of instances (and -l invocations) can thus use the same
+    database. Every write to the stream records bumps a generation number,
+    stored along with the streams and in the lock file, which other
+    processes can cheaply poll with changed(). Other values (see set()) do
+    not bump it, they are not part of the stream list.
+
+    Each stream record (a tuple, see Stream.to_record) is stored under its
+    own key, so that a single stream can be written, or the streams read one
+    at a time, without unpickling the whole list. Databases written by
+    older versions, with every stream in a list under 'streams', are
+    converted on the first write.
+
+    """
+
+    # Records read per lock acquisition by iter_records()
+    CHUNK_SIZE = 256
+    # Digits of the generation written in the lock file, fixed so that it
+    # is overwritten in place
+    GENERATION_WIDTH = 20
+
+    def __init__(self, filename):
+        self.filename      = filename
+        self.lock_filename = filename + '.lock'
+        self.generation    = None
+        # Lock file generation as of the last read or write, it lags behind
+        # for databases last written by older versions
+        self.seen          = None
+
+        db_dir = os.path.dirname(filename)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+    def _lock(self, mode):
+        fd = os.open(self.lock_filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+        except:
+            os.close(fd)
+            raise
+        return fd
+
+    def _unlock(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def _open(self, flag):
+        try:
+            return shelve.open(self.filename, flag)
+        except Exception:
+            raise ShelveError(
+                'Database could not be opened. '
+                'Please note that a database created with Python 2.x cannot be used with Python 3.x and vice versa.'
+            )
+
+    def _open_read(self):
+        """ Open for reading, None if nothing was written yet """
+        try:
+            return shelve.open(self.filename, 'r')
+        except Exception:
+            if os.path.exists(self.filename):
+                return self._open('r')
+            return None
+
+    def _lock_generation(self):
+        """ Generation last written in the lock file, read without locking """
+        try:
+            with open(self.lock_filename, 'rb') as f:
+                return int(f.read(self.GENERATION_WIDTH) or 0)
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def _read(self, func, default=None):
+        """ Call func with the shelve opened for reading, under a shared lock """
+        lock = self._lock(fcntl.LOCK_SH)
+        try:
+            f = self._open_read()
+            if f is None:
+                return default
+            try:
+                return func(f)
+            finally:
+                f.close()
+        finally:
+            self._unlock(lock)
+
+    def _write(self, func, streams=True):
+        """ Call func with the shelve opened for writing, under an exclusive
+        lock. Returns what func returns
+
+        streams : whether func changes stream records, the other processes
+                  are then told through the generation
+
+        """
+        lock = self._lock(fcntl.LOCK_EX)
+        try:
+            f = self._open('c')
+            try:
+                generation = f.get('generation', 0)
+                # Another process wrote streams since our last read or write
+                stale = generation != self.generation
+                if 'streams' in f:
+                    self._convert(f)
+                value = func(f)
+                if streams:
+                    generation += 1
+                    f['generation'] = generation
+            finally:
+                f.close()
+            if streams:
+                os.lseek(lock, 0, os.SEEK_SET)
+                os.write(lock, '{0:0{1}d}'.format(generation, self.GENERATION_WIDTH).encode())
+            if not stale:
+                # Otherwise changed() keeps reporting the streams not read yet
+                self.generation = generation
+                self.seen = self._lock_generation()
+            return value
+        finally:
+            self._unlock(lock)
+
+    def _convert(self, f):
+        """ Move streams from the single list used by older versions to
+        one key per stream """
+        records = f['streams']
+        max_id = f.get('max_id', 0)
+        for r in records:
+            idf = r['id'] if isinstance(r, dict) else r[0]
+            f[stream_key(idf)] = r
+            if isinstance(idf, int):
+                max_id = max(max_id, idf)
+        f['max_id'] = max_id
+        del f['streams']
+
+    def _keys(self, f):
+        return [k for k in f.keys() if k.startswith(STREAM_PREFIX)]
+
+    def read(self):
+        """ Return the list of stream records, under a shared lock
+
+        Records are tuples, or dicts if written by an older version.
+
+        """
+        def read_all(f):
+            self.generation = f.get('generation', 0)
+            self.seen = self._lock_generation()
+            if 'streams' in f:
+                return list(f['streams'])
+            return [f[k] for k in self._keys(f)]
+        records = self._read(read_all, default=[])
+        if self.generation is None:
+            # Nothing written yet
+            self.generation = 0
+            self.seen = self._lock_generation()
+        return records
+
+    def iter_records(self):
+        """ Yield stream records one at a time, ordered by id
+
+        The lock is only held while reading a chunk of CHUNK_SIZE records,
+        so a slow consumer does not block writers. Streams deleted in the
+        meantime are skipped.
+
+        """
+        def read_keys(f):
+            if 'streams' in f:
+                return None, list(f['streams'])
+            return self._keys(f), None
+        keys, records = self._read(read_keys, default=([], None))
+        if records is not None:
+            # Older layout, everything is in a single value anyway
+            for r in records:
+                yield r
+            return
+
+        def key_id(k):
+            idf = k[len(STREAM_PREFIX):]
+            return (0, int(idf), '') if idf.isdigit() else (1, 0, idf)
+        keys.sort(key=key_id)
+
+        for i in range(0, len(keys), self.CHUNK_SIZE):
+            chunk = keys[i:i+self.CHUNK_SIZE]
+            for r in self._read(lambda f: [f[k] for k in chunk if k in f], default=[]):
+                yield r
+
+    def get(self, key, default=None):
+        """ Read an arbitrary value """
+        return self._read(lambda f: f.get(key, default), default=default)
+
+    def changed(self):
+        """ Whether another process wrote stream records since the last read
+        or write from this one """
+        return self._lock_generation() != self.seen
+
+    def replace_streams(self, records):
+        """ Overwrite the whole stream list """
+        records = list(records)
+        def replace(f):
+            for k in self._keys(f):
+                del f[k]
+            max_id = 0
+            for r in records:
+                f[stream_key(r[0])] = r
+                if isinstance(r[0], int):
+                    max_id = max(max_id, r[0])
+            f['max_id'] = max_id
+        self._write(replace)
+
+    def save_stream(self, record):
+        """ Insert or update a single stream record
+
+        If the record id is None, a fresh id is allocated and the record is
+        returned with it.
+
+        """
+        def save(f):
+            r = record
+            if r[0] is None:
+                r = (f.get('max_id', 0) + 1,) + tuple(r[1:])
+            if isinstance(r[0], int):
+                f['max_id'] = max(f.get('max_id', 0), r[0])
+            f[stream_key(r[0])] = r
+            return r
+        return self._write(save)
+
+    def delete_stream(self, idf):
+        """ Remove a stream record by id """
+        def delete(f):
+            k = stream_key(idf)
+            if k in f:
+                del f[k]
+        self._write(delete)
+
+    def set(self, key, value):
+        """ Store an arbitrary value """
+        def set_value(f):
+            f[key] = value
+        self._write(set_value, streams=False)
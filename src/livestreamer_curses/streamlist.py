@@ -1,5 +1,4 @@
-from time import sleep, time, strftime, localtime
-import shelve
+from time import time, sleep, strftime, localtime
 import shlex
 from subprocess import STDOUT, Popen, PIPE
 import signal
@@ -7,20 +6,27 @@ import select
 import struct
 from fcntl import ioctl
 import termios
-from multiprocessing.pool import ThreadPool as Pool
-import json
 import sys
 import curses
 import os
+import re
+import errno
+import heapq
+from operator import itemgetter
 
 import livestreamer
 
-PY3 = sys.version_info.major >= 3
+from .control import ControlServer, ControlError
+from .store import StreamStore
+from .checker import CheckSweep, CircuitBreaker
+from .checkpool import CheckPool
+from .fuzzy import stream_score, is_subsequence
+from .history import History, format_stats
+from .config import load_rc
+from .groups import GroupIndex, parse_tags
+from .statustable import StatusTable, StatusTableError
 
-if PY3:
-    import queue
-else:
-    import Queue as queue
+PY3 = sys.version_info.major >= 3
 
 PROG_STRING    = 'livestreamer-curses'
 TITLE_STRING   = 'v{{0}} with Livestreamer v{1}'.format(PROG_STRING, livestreamer.__version__)
@@ -31,23 +37,218 @@ RES_FIELD_WIDTH  = 12
 VIEWS_FIELD_WIDTH = 7
 PLAYING_FIELD_OFFSET = ID_FIELD_WIDTH + NAME_FIELD_WIDTH + RES_FIELD_WIDTH + VIEWS_FIELD_WIDTH + 6
 
+# Resolution of new streams when DEFAULT_RESOLUTION gives none
+DEFAULT_RESOLUTION_HARD = '480p'
+
+# Quality names livestreamer accepts for any stream
+QUALITY_ALIASES = ('best', 'worst')
+
+# Keys that read more input from the user, see StreamList.process_keys
+PROMPT_KEYS = [ord(k) for k in 'fnruadctv']
+
+# Available orderings for the stream list, cycled with 'S'
+# (label, key function, fields the key depends on)
+SORT_KEYS = [
+    ('views',     lambda s: -s.seen,                  ('seen',)),
+    ('name',      lambda s: s.name.lower(),           ('name',)),
+    ('last seen', lambda s: -s.last_seen,             ('last_seen',)),
+    ('online',    lambda s: (s.online != 1, -s.seen), ('online', 'seen')),
+]
+
 class QueueFull(Exception): pass
 class QueueDuplicate(Exception): pass
-class ShelveError(Exception): pass
+class ConfigError(Exception): pass
+class CommandTemplateError(ConfigError): pass
+
+if PY3:
+    intern = sys.intern
+
+def intern_str(s):
+    """ Intern s if possible, resolutions are shared among many streams """
+    try:
+        return intern(s)
+    except TypeError:
+        # Python 2 cannot intern unicode strings
+        return s
+
+def intern_tags(tags):
+    """ Tags are stored as a tuple, each tag being shared among the streams """
+    return tuple(intern_str(t) for t in tags)
+
+def sort_qualities(plugin, names):
+    """ Quality names offered by plugin, best first, without the aliases """
+    def weight(name):
+        try:
+            return plugin.stream_weight(name)[0]
+        except Exception:
+            m = re.match(r'\d+', name)
+            return int(m.group()) if m else 0
+    return tuple(sorted((n for n in names if n not in QUALITY_ALIASES), key=weight, reverse=True))
+
+def playable_res(stream):
+    """ Resolution to play stream with: its own if the last check saw it
+    offered, or unknown, the best quality seen otherwise """
+    if not stream.qualities:
+        return stream.res
+    for res in stream.res.split(','):
+        res = res.strip()
+        if res in stream.qualities or res in QUALITY_ALIASES:
+            return stream.res
+    return stream.qualities[0]
+
+class Stream(object):
+    """ Compact record for a single stream
+
+    Fields can be read and written either as attributes or dict-style
+    (stream['name']), the latter being used for command line templating
+    and JSON output.
+
+    """
+
+    # Fields written to the database, 'online' and 'qualities' (available
+    # quality names, best first, as last seen by a check) are cached apart
+    RECORD_FIELDS = ('id', 'name', 'url', 'res', 'seen', 'last_seen', 'tags')
+    FIELDS = RECORD_FIELDS + ('online', 'qualities')
+
+    # Fields shown in the stream list, changing one of them dict-style bumps
+    # version so that the cached line is formatted again. Attribute writes
+    # do not, they are left for building streams and for fields not shown.
+    SHOWN_FIELDS = frozenset(('id', 'name', 'res', 'seen', 'online'))
+
+    __slots__ = FIELDS + ('version',)
+
+    def __init__(self, id, name, url, res, seen=0, last_seen=0, tags=(), online=2, qualities=()):
+        self.version   = 0
+        self.id        = id
+        self.name      = name
+        self.url       = url
+        self.res       = intern_str(res)
+        self.seen      = seen
+        self.last_seen = last_seen
+        self.tags      = intern_tags(tags)
+        self.online    = online
+        self.qualities = intern_tags(qualities)
+
+    @classmethod
+    def from_record(cls, r):
+        """ Build a Stream from a database record, either a compact tuple or
+        a dict as written by older versions """
+        if isinstance(r, dict):
+            return cls(r['id'], r['name'], r['url'], r['res'],
+                       r.get('seen') or 0, r.get('last_seen') or 0, r.get('tags') or ())
+        # Records written before tags existed have 6 fields
+        return cls(*r)
+
+    def to_record(self):
+        """ Compact tuple representation used for storage """
+        return (self.id, self.name, self.url, self.res, self.seen, self.last_seen, self.tags)
+
+    def to_dict(self):
+        return dict((k, getattr(self, k)) for k in self.FIELDS)
+
+    def keys(self):
+        return list(self.FIELDS)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        if key == 'res':
+            value = intern_str(value)
+        elif key in ('tags', 'qualities'):
+            value = intern_tags(value)
+        if key in self.SHOWN_FIELDS and getattr(self, key) != value:
+            self.version += 1
+        setattr(self, key, value)
+
+    def __getstate__(self):
+        return self.to_record() + (self.online, self.qualities)
+
+    def __setstate__(self, state):
+        self.version = 0
+        for k, v in zip(self.FIELDS, state):
+            setattr(self, k, v)
+
+    def __repr__(self):
+        return 'Stream({0!r})'.format(self.to_dict())
+
+def signal_group(p, sig):
+    """ Send sig to the process group led by p, so that the player started
+    by livestreamer gets it too. Returns False once the whole group exited """
+    try:
+        os.killpg(p.pid, sig)
+    except OSError as e:
+        if e.errno != errno.ESRCH:
+            return True
+        # Not leading a group of its own, only p can be signalled
+        if p.poll() is not None:
+            return False
+        p.send_signal(sig)
+    return True
+
+class Pin(object):
+    """ Supervision state of a pinned stream, see ProcessList.pin """
+
+    def __init__(self, stream, cmd):
+        self.stream     = stream
+        self.cmd        = cmd
+        self.started    = time()
+        # Current backoff, and when to try again, None unless the player
+        # exited and no attempt is under way
+        self.delay      = None
+        self.restart_at = None
+        # Times of the recent restarts, counted against the budget
+        self.restarts   = []
 
 class ProcessList(object):
-    """ Small class to store and handle calls to a given callable """
+    """ Small class to store and handle calls to a given callable
+
+    Streams can be pinned: when their process exits on its own, a restart
+    is scheduled after a delay which doubles on each quick exit, within a
+    budget of restarts per time window. The caller asks for the due
+    restarts with due_restarts() and performs them with restart().
 
-    def __init__(self, f, max_size=10):
+    Terminated processes get SIGTERM, then SIGKILL if they are still around
+    after a grace period.
+
+    """
+
+    def __init__(self, f, max_size=10, history=None, table=None, grace=5,
+                 backoff=(5, 300), budget=5, budget_window=3600):
         """ Create a ProcessList
 
-        f        : callable for which a process will be spawned for each call to put
-        max_size : the maximum size of the ProcessList
+        f             : callable for which a process will be spawned for each call to put
+        max_size      : the maximum size of the ProcessList
+        history       : optional History, told about every process start and end
+        table         : optional StatusTable, same
+        grace         : seconds between SIGTERM and SIGKILL
+        backoff       : (first, longest) delay before restarting a pinned stream
+        budget        : restarts allowed per budget_window seconds and stream
 
         """
         self.q        = {}
         self.max_size = max_size
         self.call     = f
+        self.history  = history
+        self.table    = table
+        self.grace    = grace
+        self.backoff  = backoff
+        self.budget   = budget
+        self.budget_window = budget_window
+        # Pinned streams by id
+        self.pinned   = {}
+        # Terminated processes not reaped yet -> time to kill them
+        self.dying    = {}
 
     def __del__(self):
         self.terminate()
@@ -68,20 +269,105 @@ class ProcessList(object):
                 raise QueueDuplicate
             p = self.call(stream, cmd)
             self.q[stream['id']] = p
+            pin = self.pinned.get(stream['id'])
+            if pin:
+                pin.started = time()
+            if self.history:
+                self.history.play(stream, p.pid)
+            if self.table:
+                self.table.update(stream['id'], playing=True, pid=p.pid)
         else:
             raise QueueFull
 
     def get_finished(self):
-        """ Clean up terminated processes and returns the list of their ids """
+        """ Clean up terminated processes and returns the list of their ids
+
+        Restarts are scheduled for the pinned ones.
+
+        """
+        self.reap()
         indices  = []
         for idf, v in self.q.items():
             if v.poll() != None:
                 indices.append(idf)
 
         for i in indices:
-            self.q.pop(i)
+            p = self.q.pop(i)
+            if self.history:
+                self.history.stop(i, p.returncode, 'exit')
+            if self.table:
+                self.table.update(i, playing=False)
+            pin = self.pinned.get(i)
+            if pin:
+                if time() - pin.started > self.backoff[1]:
+                    # It played long enough, start over with a short delay
+                    pin.delay = None
+                self.retry_later(i)
         return indices
 
+    def reap(self):
+        """ Kill the terminated processes that outlived their grace period """
+        now = time()
+        for p, deadline in list(self.dying.items()):
+            # The group outlives p if the player ignored the signal
+            p.poll()
+            if not signal_group(p, 0):
+                del self.dying[p]
+            elif now > deadline:
+                try:
+                    signal_group(p, signal.SIGKILL)
+                except OSError:
+                    pass
+
+    def pin(self, stream, cmd):
+        """ Restart stream with cmd whenever its process exits on its own """
+        if stream['id'] not in self.pinned:
+            self.pinned[stream['id']] = Pin(stream, cmd)
+
+    def unpin(self, idf):
+        return self.pinned.pop(idf, None) is not None
+
+    def is_pinned(self, idf):
+        return idf in self.pinned
+
+    def retry_later(self, idf):
+        """ Schedule the next restart of a pinned stream, backing off """
+        pin = self.pinned[idf]
+        if pin.delay is None:
+            pin.delay = self.backoff[0]
+        else:
+            pin.delay = min(pin.delay*2, self.backoff[1])
+        pin.restart_at = time() + pin.delay
+        return pin.delay
+
+    def due_restarts(self):
+        """ Returns the pinned streams due for a restart, until they are
+        restarted or retry_later is called they are not returned again """
+        now = time()
+        due = []
+        for pin in self.pinned.values():
+            if pin.restart_at is not None and pin.restart_at <= now:
+                pin.restart_at = None
+                due.append(pin.stream)
+        return due
+
+    def restart(self, idf):
+        """ Start a pinned stream again
+
+        Returns False and unpins it if it ran out of restart budget, raises
+        like put if the process could not be started.
+
+        """
+        pin = self.pinned[idf]
+        now = time()
+        pin.restarts = [t for t in pin.restarts if now - t < self.budget_window]
+        if len(pin.restarts) >= self.budget:
+            del self.pinned[idf]
+            return False
+        pin.restarts.append(now)
+        self.put(pin.stream, pin.cmd)
+        return True
+
     def get_process(self, idf):
         """ Get a process by id, returns None if there is no match """
         return self.q.get(idf)
@@ -94,119 +380,260 @@ class ProcessList(object):
         return souts
 
     def terminate_process(self, idf):
-        """ Terminate a process by id """
+        """ Terminate a process by id, it is not restarted even if pinned """
+        self.pinned.pop(idf, None)
         try:
             p = self.q.pop(idf)
-            p.terminate()
+            signal_group(p, signal.SIGTERM)
+            self.dying[p] = time() + self.grace
+            if self.history:
+                self.history.stop(idf)
+            if self.table:
+                self.table.update(idf, playing=False)
             return p
         except:
             return None
 
     def terminate(self):
-        """ Terminate all processes """
-        for w in self.q.values():
+        """ Terminate all processes, waiting at most the grace period for
+        them to exit before killing them """
+        self.pinned = {}
+        deadline = time() + self.grace
+        for idf, w in self.q.items():
             try:
-                w.terminate()
+                signal_group(w, signal.SIGTERM)
+                self.dying[w] = deadline
             except:
                 pass
+            if self.history:
+                self.history.stop(idf)
+            if self.table:
+                self.table.update(idf, playing=False)
 
         self.q = {}
+        while self.dying and time() < deadline + 1:
+            self.reap()
+            if self.dying:
+                sleep(0.05)
+
+class CommandTemplate(object):
+    """ A command line from LIVESTREAMER_COMMANDS, compiled once
+
+    {{key}} placeholders are located when the template is built so that
+    rendering for a given stream is a single pass over the argument slots
+    that actually contain placeholders.
+
+    """
+
+    # Placeholder name -> Stream field
+    KEYS = {
+        'id'        : 'id',
+        'url'       : 'url',
+        'name'      : 'name',
+        'res'       : 'res',
+        'views'     : 'seen',
+        'last_seen' : 'last_seen',
+        'online'    : 'online'
+    }
+
+    PLACEHOLDER_RE = re.compile(r'{{(.*?)}}')
+
+    def __init__(self, cmd):
+        """ Compile a command line, raises CommandTemplateError on unknown placeholders
+
+        cmd : the command line as a string, split with shlex
+
+        """
+        self.args  = shlex.split(cmd)
+        self.slots = []
+        for i, arg in enumerate(self.args):
+            # Even indices are literal text, odd ones placeholder names
+            parts = self.PLACEHOLDER_RE.split(arg)
+            if len(parts) == 1:
+                continue
+            for j in range(1, len(parts), 2):
+                key = parts[j]
+                if key not in self.KEYS:
+                    raise CommandTemplateError(
+                        'Unknown placeholder {{{{{0}}}}} in command line: {1}'.format(key, cmd))
+                parts[j] = self.KEYS[key]
+            self.slots.append((i, parts))
+
+    def render(self, stream, res=None):
+        """ Return the argument list for stream, url and resolution appended
+
+        res : resolution to use instead of the stream one
+
+        """
+        full_cmd = list(self.args)
+        for i, parts in self.slots:
+            full_cmd[i] = ''.join(p if j % 2 == 0 else str(res if p == 'res' and res else stream[p])
+                                  for j, p in enumerate(parts))
+        full_cmd.extend([stream['url'], res or stream['res']])
+        return full_cmd
+
+    def __str__(self):
+        return ' '.join(self.args)
+
+DEFAULT_COMMAND = CommandTemplate('livestreamer')
 
 class StreamPlayer(object):
     """ Provides a callable to play a given url """
 
-    def play(self, stream, cmd=['livestreamer']):
-        full_cmd = list(cmd)
-        for k in stream.keys():
-            for i, arg in enumerate(full_cmd):
-                if k == 'seen':
-                    key = 'views'
-                else:
-                    key = k
-                full_cmd[i] = arg.replace('{{'+key+'}}', stream[k].__str__())
-        full_cmd.extend([stream['url'], stream['res']])
-        return Popen(full_cmd, stdout=PIPE, stderr=STDOUT)
+    def play(self, stream, cmd=DEFAULT_COMMAND):
+        # In a session of its own, the player livestreamer starts is then
+        # terminated along with it, see signal_group
+        args = cmd.render(stream, playable_res(stream))
+        if PY3:
+            return Popen(args, stdout=PIPE, stderr=STDOUT, start_new_session=True)
+        return Popen(args, stdout=PIPE, stderr=STDOUT, preexec_fn=os.setsid)
+
+def validate_config(config):
+    """ Check that a config module is usable, raises ConfigError otherwise
+
+    Returns the compiled LIVESTREAMER_COMMANDS.
+
+    """
+    if not config.LIVESTREAMER_COMMANDS:
+        raise ConfigError('LIVESTREAMER_COMMANDS must not be empty')
+    cmd_list = list(map(CommandTemplate, config.LIVESTREAMER_COMMANDS))
+    if (len(config.INDICATORS) != 5
+        or not all(isinstance(i, type('')) or isinstance(i, type(u'')) for i in config.INDICATORS)):
+        raise ConfigError('INDICATORS must be a list of 5 strings')
+    for name in ('CHECK_ONLINE_THREADS', 'CHECK_ONLINE_INTERVAL', 'CHECK_ONLINE_TIMEOUT',
+                 'CHECK_ONLINE_BREAKER_THRESHOLD', 'CHECK_ONLINE_BREAKER_COOLDOWN',
+                 'PLAYER_TERMINATE_GRACE', 'PLAYER_RESTART_DELAY', 'PLAYER_RESTART_MAX_DELAY',
+                 'PLAYER_RESTART_BUDGET', 'PLAYER_RESTART_WINDOW'):
+        if not isinstance(getattr(config, name), (int, float)):
+            raise ConfigError('{0} must be a number'.format(name))
+    if config.CHECK_ONLINE_THREADS < 1:
+        raise ConfigError('CHECK_ONLINE_THREADS must be at least 1')
+    if config.CHECK_ONLINE_BACKEND not in ('threads', 'processes'):
+        raise ConfigError('CHECK_ONLINE_BACKEND must be \'threads\' or \'processes\'')
+    for name in ('CHECK_ONLINE_PROCESSES', 'CHECK_ONLINE_WORKER_MAX_CHECKS'):
+        if not isinstance(getattr(config, name), int) or getattr(config, name) < 1:
+            raise ConfigError('{0} must be a positive integer'.format(name))
+    if not isinstance(config.CHECK_ONLINE_WORKER_MAX_RSS, (int, float)):
+        raise ConfigError('CHECK_ONLINE_WORKER_MAX_RSS must be a number')
+    if (not isinstance(config.CHECK_ONLINE_GROUP_INTERVALS, dict)
+        or not all(isinstance(v, (int, float)) for v in config.CHECK_ONLINE_GROUP_INTERVALS.values())):
+        raise ConfigError('CHECK_ONLINE_GROUP_INTERVALS must map group names to numbers')
+    return cmd_list
+
+def import_streams(store, stream_list):
+    """ Overwrite the database with a list of stream dicts, e.g. read from JSON """
+    records = []
+    for i, s in enumerate(stream_list):
+        s['id'] = s.get('id') or i
+        records.append(Stream.from_record(s).to_record())
+    store.replace_streams(records)
 
 class StreamList(object):
 
-    def __init__(self, filename, config, list_streams=False, init_stream_list=None):
+    def __init__(self, filename, config, init_stream_list=None, rc_filename=None):
         """ Init and try to load a stream list, nothing about curses yet """
 
         global TITLE_STRING
 
         self.db_was_read = False
+        self.control = None
+        # Live status for external monitors, created in init
+        self.table = None
+        # Worker processes, when CHECK_ONLINE_BACKEND is 'processes'
+        self.check_pool = None
+
+        # Compile command lines first so that a faulty rc file is reported
+        # before touching the database
+        self.cmd_list = validate_config(config)
+        self.cmd_index = 0
+        self.cmd = self.cmd_list[self.cmd_index]
 
-        # Open the storage (create it if necessary)
-        try:
-            db_dir = os.path.dirname(filename)
-            if not os.path.exists(db_dir):
-                os.makedirs(db_dir)
-            f = shelve.open(filename, 'c')
-        except Exception:
-            raise ShelveError(
-                'Database could not be opened, another livestreamer-curses instance might be already running. '
-                'Please note that a database created with Python 2.x cannot be used with Python 3.x and vice versa.'
-            )
+        # The storage is shared with other instances, it is only locked
+        # for the duration of each read or write
+        self.store = StreamStore(filename)
 
-        self.max_id = 0
         if init_stream_list:
-            f['streams'] = init_stream_list
-            for i, s in enumerate(f['streams']):
-                s['id'] = s.get('id') or i
-                s['seen'] = s.get('seen') or 0
-                s['last_seen'] = s.get('last_seen') or 0
-            self.max_id = i
-            f.sync()
+            import_streams(self.store, init_stream_list)
 
         # Sort streams by view count
+        self.sort_index = 0
+        self.sort_label, self.sort_key, self.sort_fields = SORT_KEYS[self.sort_index]
+        records = self.store.read()
         try:
-            self.streams = sorted(f['streams'], key=lambda s:s['seen'], reverse=True)
-            for s in self.streams:
-                # Max id, needed when adding a new stream
-                self.max_id = max(self.max_id, s['id'])
-                s['online'] = 2
-            if list_streams:
-                print(json.dumps(self.streams))
-                f.close()
-                sys.exit(0)
-        except:
+            self.streams = sorted(map(Stream.from_record, records), key=self.sort_key)
+        except Exception:
             self.streams = []
+        if self.streams and any(isinstance(r, dict) for r in records):
+            # Written by an older version, convert to compact records once
+            self.store.replace_streams([s.to_record() for s in self.streams])
         self.db_was_read = True
+        self.load_qualities()
         self.filtered_streams = list(self.streams)
         self.filter = ''
+        # (score, stream) for every match of a non-empty filter, and the
+        # number of rows requested beyond one screen
+        self.filter_matches = None
+        self.filter_rows = 0
+        # Streams by tag, and the group shown, None for all streams
+        self.groups = GroupIndex(self.streams)
+        self.group = None
         self.all_streams_offline = None
         self.show_offline_streams = False
         self.config = config
+        # The rc file is reloaded when it changes, see check_rc_file
+        self.rc_filename = rc_filename
+        self.rc_stat = self.get_rc_stat()
 
         TITLE_STRING = TITLE_STRING.format(self.config.VERSION)
 
-        self.cmd_list = list(map(shlex.split, self.config.LIVESTREAMER_COMMANDS))
-        self.cmd_index = 0
-        self.cmd = self.cmd_list[self.cmd_index]
-
         self.last_autocheck = 0
+        # Time of the last check of each group, see CHECK_ONLINE_GROUP_INTERVALS
+        self.last_group_check = {}
 
         self.default_res = self.config.DEFAULT_RESOLUTION
 
-        self.store = f
-        self.store.sync()
-
         self.no_streams = self.streams == []
         self.no_stream_shown = self.no_streams
-        self.q = ProcessList(StreamPlayer().play)
+        if self.config.HISTORY_ENABLED:
+            self.history = History(filename + '.history', self.config.HISTORY_MAX_SIZE,
+                                   self.config.HISTORY_BACKUPS)
+        else:
+            self.history = None
+        self.q = ProcessList(StreamPlayer().play, history=self.history)
+        self.configure_supervision()
+        # Online check of the pinned streams about to be restarted
+        self.restart_sweep = None
+        # Checks run while the UI goes on, as (sweep, callable called once
+        # it is done), see poll_background_checks
+        self.background_checks = []
 
         self.livestreamer = livestreamer.Livestreamer()
+        if self.config.CHECK_ONLINE_TIMEOUT > 0:
+            # Abandoned checks still hold a thread until their request ends
+            self.livestreamer.set_option('http-timeout', self.config.CHECK_ONLINE_TIMEOUT)
+
+        # Reason of the last failed check, by stream id
+        self.check_errors = {}
+        # Formatted lines of the stream list by stream id, as
+        # (stream, version, playing, line), see format_stream_line
+        self.render_cache = {}
+        self.breaker = CircuitBreaker(self.config.CHECK_ONLINE_BREAKER_THRESHOLD,
+                                      self.config.CHECK_ONLINE_BREAKER_COOLDOWN)
 
     def __del__(self):
         """ Stop playing streams and sync storage """
         try:
             self.q.terminate()
             if self.db_was_read:
-                self.store['cmd'] = self.cmd
-                self.store['streams'] = self.streams
-                self.store.close()
+                self.store.set('cmd', self.cmd.args)
         except:
             pass
+        if self.control:
+            self.control.close()
+        if self.table:
+            self.table.close()
+        if self.check_pool:
+            self.check_pool.close()
 
     def __call__(self, s):
         # Terminal initialization
@@ -235,13 +662,52 @@ class StreamList(object):
         self.set_title(TITLE_STRING)
 
         self.got_g = False
+        # Numeric prefix typed before a command, e.g. 50%
+        self.count = 0
+        # Keys were pushed back with ungetch and are waiting to be read
+        self.input_pending = False
 
         signal.signal(28, self.resize)
 
+        status = self.open_status_table() or 'Ready'
+
         if self.config.CHECK_ONLINE_ON_START:
             self.check_online_streams()
 
-        self.set_status('Ready')
+        status = self.open_control_socket() or status
+
+        self.set_status(status)
+
+    def open_status_table(self):
+        """ Publish the live status in STATUS_TABLE, in place of the current
+        table if any. Returns an error message if it could not be created """
+        if self.table:
+            self.table.close()
+            self.table = self.q.table = None
+        if not self.config.STATUS_TABLE:
+            return None
+        try:
+            table = StatusTable(os.path.expanduser(self.config.STATUS_TABLE))
+            table.sync(self.streams, dict((i, p.pid) for i, p in self.q.q.items()))
+        except (StatusTableError, EnvironmentError) as e:
+            return 'Status table disabled: {0}'.format(e)
+        self.table = self.q.table = table
+        return None
+
+    def open_control_socket(self):
+        """ Listen on CONTROL_SOCKET, in place of the current socket if any.
+        Returns an error message if it could not be created """
+        if self.control:
+            self.control.close()
+            self.control = None
+        if not self.config.CONTROL_SOCKET:
+            return None
+        try:
+            self.control = ControlServer(os.path.expanduser(self.config.CONTROL_SOCKET),
+                                         self.control_request)
+        except (ControlError, EnvironmentError) as e:
+            return 'Control socket disabled: {0}'.format(e)
+        return None
 
     def getheightwidth(self):
         """ getwidth() -> (int, int)
@@ -267,6 +733,8 @@ class StreamList(object):
         self.set_screen_size()
         self.set_title(TITLE_STRING)
         self.init_help()
+        if self.current_pad == 'stats':
+            self.init_stats_pad()
         self.init_streams_pad()
         self.move(stream_cursor, absolute=True, pad_name='streams', refresh=False)
         self.s.refresh()
@@ -281,25 +749,45 @@ class StreamList(object):
         while True:
             self.s.refresh()
 
-            # See if any stream has ended
+            # See if any stream has ended, and restart the pinned ones
             self.check_stopped_streams()
+            self.supervise_streams()
+            self.poll_background_checks()
 
-            # Wait on stdin or on the streams output
+            # See if the rc file was edited
+            self.check_rc_file()
+
+            # See if another instance changed the database
+            if self.current_pad == 'streams' and self.store.changed():
+                self.reload_streams()
+
+            # Wait on stdin, on the streams output or on the control socket
             souts = self.q.get_stdouts()
             souts.append(sys.stdin)
+            timeout = 0 if self.input_pending else 1
+            if self.background_checks and timeout:
+                # Pick check results up soon after they come in
+                timeout = 0.1
+            if self.control:
+                souts.extend(self.control.get_sockets())
+                if self.control.has_pending():
+                    timeout = 0
             try:
-                (r, w, x) = select.select(souts, [], [], 1)
+                (r, w, x) = select.select(souts, [], [], timeout)
             except select.error:
                 continue
+            if self.input_pending and sys.stdin not in r:
+                r.append(sys.stdin)
+            if self.control:
+                # Only a few requests are served per wakeup, so that stdin
+                # is still read on every iteration during a burst
+                ctl = [fd for fd in r if self.control.owns(fd)]
+                r = [fd for fd in r if fd not in ctl]
+                for fd in ctl:
+                    self.control.handle(fd)
+                self.control.process_pending()
             if not r:
-                if self.config.CHECK_ONLINE_INTERVAL <= 0: continue
-                cur_time = int(time())
-                time_delta = cur_time - self.last_autocheck
-                if time_delta > self.config.CHECK_ONLINE_INTERVAL:
-                    self.check_online_streams()
-                    self.set_status('Next check at {0}'.format(
-                        strftime('%H:%M:%S', localtime(time() + self.config.CHECK_ONLINE_INTERVAL))
-                        ))
+                self.run_scheduled_checks()
                 continue
             for fd in r:
                 if fd != sys.stdin:
@@ -307,65 +795,197 @@ class StreamList(object):
                     msg = fd.readline()
                     if msg:
                         self.set_status(msg[:-1])
-                else:
-                    # Main event loop
-                    c = self.pads[self.current_pad].getch()
-                    if c == curses.KEY_UP or c == ord('k'):
-                        self.move(-1)
-                    elif c == curses.KEY_DOWN or c == ord('j'):
-                        self.move(1)
-                    elif c == ord('f'):
-                        if self.current_pad == 'streams':
-                            self.filter_streams()
-                    elif c == ord('F'):
-                        if self.current_pad == 'streams':
-                            self.clear_filter()
-                    elif c == ord('g'):
-                        if self.got_g:
-                            self.move(0, absolute=True)
-                            self.got_g = False
-                            continue
-                        self.got_g = True
-                    elif c == ord('G'):
-                        self.move(len(self.filtered_streams)-1, absolute=True)
-                    elif c == ord('q'):
-                        if self.current_pad == 'streams':
-                            self.q.terminate()
-                            return
-                        else:
-                            self.show_streams()
-                    elif c == 27: # ESC
-                        if self.current_pad != 'streams':
-                            self.show_streams()
-                    if self.current_pad == 'help':
-                        continue
-                    elif c == 10:
-                        self.play_stream()
-                    elif c == ord('s'):
-                        self.stop_stream()
-                    elif c == ord('c'):
-                        self.reset_stream()
-                    elif c == ord('n'):
-                        self.edit_stream('name')
-                    elif c == ord('r'):
-                        self.edit_stream('res')
-                    elif c == ord('u'):
-                        self.edit_stream('url')
-                    elif c == ord('l'):
-                        self.show_commandline()
-                    elif c == ord('L'):
-                        self.shift_commandline()
-                    elif c == ord('a'):
-                        self.prompt_new_stream()
-                    elif c == ord('d'):
-                        self.delete_stream()
-                    elif c == ord('o'):
-                        self.show_offline_streams ^= True
-                        self.refilter_streams()
-                    elif c == ord('O'):
-                        self.check_online_streams()
-                    elif c == ord('h') or c == ord('?'):
-                        self.show_help()
+                elif not self.process_keys(self.read_keys()):
+                    self.q.terminate()
+                    return
+
+    def run_scheduled_checks(self):
+        """ Check all streams every CHECK_ONLINE_INTERVAL seconds, and the
+        groups of CHECK_ONLINE_GROUP_INTERVALS on their own schedule """
+        cur_time = int(time())
+        interval = self.config.CHECK_ONLINE_INTERVAL
+        if interval > 0 and cur_time - self.last_autocheck > interval:
+            self.check_online_streams()
+            self.set_status('Next check at {0}'.format(
+                strftime('%H:%M:%S', localtime(time() + interval))
+                ))
+            return
+        for group, interval in sorted(self.config.CHECK_ONLINE_GROUP_INTERVALS.items()):
+            if interval <= 0 or group not in self.groups:
+                continue
+            # A full check counts as a check of every group
+            last = max(self.last_autocheck, self.last_group_check.get(group, 0))
+            if cur_time - last > interval:
+                # One group per wakeup, so that keys are read in between
+                self.check_online_streams(group)
+                return
+
+    def read_keys(self):
+        """ Drain all the pending keys """
+        self.input_pending = False
+        pad = self.pads[self.current_pad]
+        pad.nodelay(1)
+        keys = []
+        try:
+            while True:
+                c = pad.getch()
+                if c == -1:
+                    break
+                keys.append(c)
+        finally:
+            pad.nodelay(0)
+        return keys
+
+    def move_step(self, c):
+        """ Number of rows a key moves the cursor in the stream list, None if
+        the key is not a relative move """
+        if self.current_pad != 'streams':
+            return None
+        count = self.count or 1
+        page = max(1, self.pad_h - 1)
+        if c == curses.KEY_UP or c == ord('k'):
+            return -count
+        elif c == curses.KEY_DOWN or c == ord('j'):
+            return count
+        elif c == curses.KEY_PPAGE or c == 2: # ^B
+            return -page*count
+        elif c == curses.KEY_NPAGE or c == 6: # ^F
+            return page*count
+        return None
+
+    def move_by(self, delta):
+        """ Move the stream list cursor by delta rows, without refreshing """
+        if self.no_stream_shown:
+            return
+        row = self.pads['streams'].getyx()[0]
+        if row + delta >= len(self.filtered_streams):
+            self.show_more_matches(row + delta + self.pad_h)
+        target = max(0, min(len(self.filtered_streams)-1, row + delta))
+        self.move(target, absolute=True, refresh=False)
+
+    def process_keys(self, keys):
+        """ Handle a batch of keys, returns False to quit
+
+        Consecutive moves are collapsed into a single jump and the pad is
+        refreshed once for the whole batch.
+
+        """
+        delta = 0
+        for n, c in enumerate(keys):
+            if ord('0') <= c <= ord('9') and (self.count or c != ord('0')):
+                self.count = self.count*10 + c - ord('0')
+                continue
+            step = self.move_step(c)
+            if step is not None:
+                self.count = 0
+                delta += step
+                continue
+            if delta:
+                self.move_by(delta)
+                delta = 0
+            if c in PROMPT_KEYS and n < len(keys)-1:
+                # The rest of the batch is typed into the prompt, whatever
+                # it leaves behind is read on the next loop iteration
+                for k in reversed(keys[n+1:]):
+                    curses.ungetch(k)
+                self.input_pending = True
+                return self.handle_key(c)
+            if not self.handle_key(c):
+                return False
+        if delta:
+            self.move_by(delta)
+        self.refresh_current_pad()
+        return True
+
+    def handle_key(self, c):
+        """ Handle a single key, returns False to quit """
+        count = self.count
+        self.count = 0
+        if c != ord('g'):
+            self.got_g = False
+        if c == curses.KEY_UP or c == ord('k'):
+            self.move(-1)
+        elif c == curses.KEY_DOWN or c == ord('j'):
+            self.move(1)
+        elif c == curses.KEY_PPAGE or c == 2:
+            self.move(-1)
+        elif c == curses.KEY_NPAGE or c == 6:
+            self.move(1)
+        elif c == ord('f'):
+            if self.current_pad == 'streams':
+                self.filter_streams()
+        elif c == ord('F'):
+            if self.current_pad == 'streams':
+                self.clear_filter()
+        elif c == ord('g'):
+            if self.got_g:
+                self.move(0, absolute=True)
+                self.got_g = False
+                return True
+            self.got_g = True
+        elif c == ord('G'):
+            if self.filter_matches and self.current_pad == 'streams':
+                self.show_more_matches(count or len(self.filter_matches))
+            if count and self.current_pad == 'streams':
+                self.move(min(count, len(self.filtered_streams))-1, absolute=True)
+            else:
+                self.move(len(self.filtered_streams)-1, absolute=True)
+        elif c == ord('%'):
+            if count and self.current_pad == 'streams' and not self.no_stream_shown:
+                if self.filter_matches:
+                    self.show_more_matches(len(self.filter_matches))
+                target = min(count, 100) * (len(self.filtered_streams)-1) // 100
+                self.move(target, absolute=True)
+        elif c == ord('q'):
+            if self.current_pad == 'streams':
+                return False
+            else:
+                self.show_streams()
+        elif c == 27: # ESC
+            if self.current_pad != 'streams':
+                self.show_streams()
+        if self.current_pad != 'streams':
+            return True
+        elif c == 10:
+            self.play_stream()
+        elif c == ord('s'):
+            self.stop_stream()
+        elif c == ord('p'):
+            self.toggle_pin()
+        elif c == ord('c'):
+            self.reset_stream()
+        elif c == ord('n'):
+            self.edit_stream('name')
+        elif c == ord('r'):
+            self.edit_resolution()
+        elif c == ord('u'):
+            self.edit_stream('url')
+        elif c == ord('t'):
+            self.edit_tags()
+        elif c == ord('v'):
+            self.prompt_group()
+        elif c == ord('V'):
+            self.cycle_group()
+        elif c == ord('l'):
+            self.show_commandline()
+        elif c == ord('L'):
+            self.shift_commandline()
+        elif c == ord('a'):
+            self.prompt_new_stream()
+        elif c == ord('d'):
+            self.delete_stream()
+        elif c == ord('o'):
+            self.show_offline_streams ^= True
+            self.refilter_streams()
+        elif c == ord('O'):
+            self.check_online_streams(self.group)
+        elif c == ord('S'):
+            self.cycle_sort_key()
+        elif c == ord('h') or c == ord('?'):
+            self.show_help()
+        elif c == ord('H'):
+            self.show_stats()
+        return True
 
     def set_screen_size(self):
         """ Setup screen size and padding
@@ -378,6 +998,8 @@ class StreamList(object):
         self.pad_x = 0
         self.max_y, self.max_x = (height-1, width-1)
         self.pad_h = height-3
+        if getattr(self, 'pad_w', None) != width-2*self.pad_x:
+            self.render_cache = {}
         self.pad_w = width-2*self.pad_x
 
     def overwrite_line(self, msg, attr=curses.A_NORMAL):
@@ -408,42 +1030,66 @@ class StreamList(object):
         self.overwrite_line('')
 
     def init_help(self):
-        help_pad_length = 27    # there should be a neater way to do this
+        help_pad_length = 36    # there should be a neater way to do this
         h = curses.newpad(help_pad_length, self.pad_w)
         h.keypad(1)
 
         h.addstr( 0, 0, 'STREAM MANAGEMENT', curses.A_BOLD)
         h.addstr( 2, 0, '  Enter : start stream')
         h.addstr( 3, 0, '  s     : stop stream')
-        h.addstr( 4, 0, '  r     : change stream resolution')
-        h.addstr( 5, 0, '  n     : change stream name')
-        h.addstr( 6, 0, '  u     : change stream URL')
-        h.addstr( 7, 0, '  c     : reset stream view count')
-        h.addstr( 8, 0, '  a     : add stream')
-        h.addstr( 9, 0, '  d     : delete stream')
-
-        h.addstr(11, 0, '  l     : show command line')
-        h.addstr(12, 0, '  L     : cycle command line')
-
-        h.addstr(15, 0, 'NAVIGATION', curses.A_BOLD)
-        h.addstr(17, 0, '  j/up  : up one line')
-        h.addstr(18, 0, '  k/down: down one line')
-        h.addstr(19, 0, '  f     : filter streams')
-        h.addstr(20, 0, '  F     : clear filter')
-        h.addstr(21, 0, '  o     : toggle offline streams')
-        h.addstr(22, 0, '  O     : check for online streams')
-        h.addstr(23, 0, '  gg    : go to top')
-        h.addstr(24, 0, '  G     : go to bottom')
-        h.addstr(25, 0, '  h/?   : show this help')
-        h.addstr(26, 0, '  q     : quit')
+        h.addstr( 4, 0, '  p     : pin stream, restart it whenever its player exits')
+        h.addstr( 5, 0, '  r     : change stream resolution, among those last seen')
+        h.addstr( 6, 0, '  n     : change stream name')
+        h.addstr( 7, 0, '  u     : change stream URL')
+        h.addstr( 8, 0, '  t     : change stream tags')
+        h.addstr( 9, 0, '  c     : reset stream view count')
+        h.addstr(10, 0, '  a     : add stream')
+        h.addstr(11, 0, '  d     : delete stream')
+
+        h.addstr(13, 0, '  l     : show command line')
+        h.addstr(14, 0, '  L     : cycle command line')
+        h.addstr(15, 0, '  H     : show playback statistics')
+
+        h.addstr(17, 0, 'NAVIGATION', curses.A_BOLD)
+        h.addstr(19, 0, '  k/up  : up one line')
+        h.addstr(20, 0, '  j/down: down one line')
+        h.addstr(21, 0, '  PgUp/PgDn, ^B/^F : up/down one page')
+        h.addstr(22, 0, '  f     : filter streams')
+        h.addstr(23, 0, '  F     : clear filter')
+        h.addstr(24, 0, '  v     : show a group (tag), empty for all streams')
+        h.addstr(25, 0, '  V     : cycle groups')
+        h.addstr(26, 0, '  o     : toggle offline streams')
+        h.addstr(27, 0, '  O     : check for online streams, in the shown group only')
+        h.addstr(28, 0, '  S     : cycle sort order')
+        h.addstr(29, 0, '  gg    : go to top')
+        h.addstr(30, 0, '  G     : go to bottom, NG to line N')
+        h.addstr(31, 0, '  N%    : go to N% of the list')
+        h.addstr(32, 0, '  h/?   : show this help')
+        h.addstr(33, 0, '  q     : quit')
+        h.addstr(34, 0, '  Moves take a count, e.g. 5j')
 
         self.pads['help'] = h
         self.offsets['help'] = 0
 
+    def init_stats_pad(self):
+        """ Create a pad with the playback statistics """
+        if self.history:
+            lines = format_stats(self.history.read_stats())
+        else:
+            lines = ['Playback history is disabled, see HISTORY_ENABLED']
+        h = curses.newpad(len(lines), self.pad_w)
+        h.keypad(1)
+        for y, line in enumerate(lines):
+            attr = curses.A_BOLD if line.isupper() else curses.A_NORMAL
+            h.addstr(y, 0, line[:self.pad_w-1], attr)
+        self.pads['stats'] = h
+        self.offsets['stats'] = 0
+
     def show(self):
         funcs = {
             'streams' : self.show_streams,
-            'help'    : self.show_help
+            'help'    : self.show_help,
+            'stats'   : self.show_stats
         }
         funcs[self.current_pad]()
 
@@ -457,6 +1103,18 @@ class StreamList(object):
         self.current_pad = 'help'
         self.refresh_current_pad()
 
+    def show_stats(self):
+        """ Redraw the statistics screen """
+        if self.current_pad != 'stats':
+            self.init_stats_pad()
+        self.s.move(1,0)
+        self.s.clrtobot()
+        self.set_header('Playback statistics'.center(self.pad_w))
+        self.set_footer(' ESC or \'q\' to return to main menu')
+        self.s.refresh()
+        self.current_pad = 'stats'
+        self.refresh_current_pad()
+
     def init_streams_pad(self, start_row=0):
         """ Create a curses pad and populate it with a line by stream """
         y = 0
@@ -529,7 +1187,7 @@ class StreamList(object):
         # pads in this list will be moved screen-wise as opposed to line-wise
         # if absolute is set, will go all the way top or all the way down depending
         # on direction
-        scroll_only = [ 'help' ]
+        scroll_only = [ 'help', 'stats' ]
 
         if not pad_name:
             pad_name = self.current_pad
@@ -543,12 +1201,12 @@ class StreamList(object):
         if pad_name in scroll_only:
             if absolute:
                 if direction > 0:
-                    new_offset = pad.getmaxyx()[0] - self.pad_h + 1
+                    new_offset = max(0, pad.getmaxyx()[0] - self.pad_h + 1)
                 else:
                     new_offset = 0
             else:
                 if direction > 0:
-                    new_offset = min(pad.getmaxyx()[0] - self.pad_h + 1, offset + self.pad_h)
+                    new_offset = max(0, min(pad.getmaxyx()[0] - self.pad_h + 1, offset + self.pad_h))
                 elif offset > 0:
                     new_offset = max(0, offset - self.pad_h)
         else:
@@ -580,16 +1238,43 @@ class StreamList(object):
             self.refresh_current_pad()
 
     def format_stream_line(self, stream):
+        """ Line of a stream in the list, only formatted again when the
+        stream version or its playing state changed """
+        p = stream.id in self.q.q
+        cached = self.render_cache.get(stream.id)
+        if cached and cached[0] is stream and cached[1] == stream.version and cached[2] == p:
+            return cached[3]
         idf = '{0} '.format(stream['id']).rjust(ID_FIELD_WIDTH)
         name = ' {0}'.format(stream['name'][:NAME_FIELD_WIDTH-2]).ljust(NAME_FIELD_WIDTH)
         res  = ' {0}'.format(stream['res'][:RES_FIELD_WIDTH-2]).ljust(RES_FIELD_WIDTH)
         views  = '{0} '.format(stream['seen']).rjust(VIEWS_FIELD_WIDTH)
-        p = self.q.get_process(stream['id']) != None
         if p:
             indicator = self.config.INDICATORS[4] # playing
         else:
             indicator = self.config.INDICATORS[stream['online']]
-        return '{0} {1} {2} {3}   {4}'.format(idf, name, res, views, indicator)
+        line = '{0} {1} {2} {3}   {4}'.format(idf, name, res, views, indicator)
+        self.render_cache[stream.id] = (stream, stream.version, p, line)
+        return line
+
+    def redraw_stream(self, stream):
+        """ Redraw the line of a given stream, if it is shown """
+        try:
+            row = self.filtered_streams.index(stream)
+        except ValueError:
+            return
+        pad = self.pads['streams']
+        cursor = pad.getyx()[0]
+        if row == cursor:
+            attr = curses.A_REVERSE
+        else:
+            attr = curses.A_NORMAL
+        pad.move(row, 0)
+        pad.clrtoeol()
+        pad.addstr(row, 0, self.format_stream_line(stream), attr)
+        pad.chgat(attr)
+        pad.move(cursor, 0)
+        if self.current_pad == 'streams':
+            self.refresh_current_pad()
 
     def redraw_current_line(self):
         """ Redraw the highlighted line """
@@ -618,7 +1303,16 @@ class StreamList(object):
         if not self.no_stream_shown:
             row = self.pads[self.current_pad].getyx()[0]
             s = self.filtered_streams[row]
-            self.set_footer('{0}/{1} {2} {3}'.format(row+1, len(self.filtered_streams), s['url'], s['res']))
+            footer = '{0}/{1} {2} {3}'.format(row+1, len(self.filtered_streams), s['url'], s['res'])
+            if s.tags:
+                footer += ' [{0}]'.format(' '.join(s.tags))
+            if self.q.is_pinned(s.id):
+                footer += ' (pinned)'
+
+            err = self.check_errors.get(s.id)
+            if err:
+                footer += ' ({0})'.format(err)
+            self.set_footer(footer)
             self.s.refresh()
 
     def check_stopped_streams(self):
@@ -630,7 +1324,12 @@ class StreamList(object):
                 except ValueError:
                     continue
                 if f == s['id']:
-                    self.set_footer('Stream {0} has stopped'.format(s['name']))
+                    pin = self.q.pinned.get(f)
+                    if pin:
+                        self.set_footer('Stream {0} has stopped, restarting in {1}s'.format(
+                            s['name'], int(pin.delay)))
+                    else:
+                        self.set_footer('Stream {0} has stopped'.format(s['name']))
                     if i == self.pads[self.current_pad].getyx()[0]:
                         attr = curses.A_REVERSE
                     else:
@@ -639,50 +1338,237 @@ class StreamList(object):
                                                 self.config.INDICATORS[s['online']], attr)
                     self.refresh_current_pad()
 
+    def supervise_streams(self):
+        """ Restart the pinned streams whose player exited, once a check
+        finds them online, so that offline streams are not hammered """
+        if self.restart_sweep is None:
+            due = self.q.due_restarts()
+            if due:
+                self.restart_sweep = self.start_sweep([(s, s.url) for s in due])
+            return
+        for s, status, reason, qualities in self.restart_sweep.poll():
+            self.record_check(s, status, reason, qualities)
+            if qualities:
+                self.save_qualities()
+            if not self.q.is_pinned(s.id):
+                # Unpinned or stopped meanwhile
+                continue
+            if status != 1:
+                delay = self.q.retry_later(s.id)
+                self.set_status(' Stream {0} is not online, retrying in {1}s'.format(s.name, int(delay)))
+                self.redraw_stream(s)
+                continue
+            try:
+                restarted = self.q.restart(s.id)
+            except (QueueFull, OSError) as e:
+                delay = self.q.retry_later(s.id)
+                self.set_status(' Could not restart stream {0} ({1}), retrying in {2}s'.format(
+                    s.name, 'too many streams playing' if isinstance(e, QueueFull) else e.strerror,
+                    int(delay)))
+                continue
+            except QueueDuplicate:
+                # Started by hand meanwhile
+                continue
+            if restarted:
+                self.set_status(' Restarted stream {0}'.format(s.name))
+            else:
+                self.set_status(' Gave up restarting stream {0}, {1} restarts in {2}s'.format(
+                    s.name, self.q.budget, self.q.budget_window))
+            self.redraw_stream(s)
+        if self.restart_sweep.done:
+            self.restart_sweep = None
+
+    def configure_supervision(self):
+        self.q.grace         = self.config.PLAYER_TERMINATE_GRACE
+        self.q.backoff       = (self.config.PLAYER_RESTART_DELAY, self.config.PLAYER_RESTART_MAX_DELAY)
+        self.q.budget        = self.config.PLAYER_RESTART_BUDGET
+        self.q.budget_window = self.config.PLAYER_RESTART_WINDOW
+
+    def toggle_pin(self, s=None):
+        """ Pin the highlighted stream, or s if given, starting it if needed,
+        or unpin it. Returns an error message if it could not be started """
+        if s is None:
+            if self.no_stream_shown:
+                return
+            pad = self.pads[self.current_pad]
+            s = self.filtered_streams[pad.getyx()[0]]
+        if self.q.unpin(s.id):
+            self.set_status(' Stream {0} unpinned'.format(s.name))
+        else:
+            if self.q.get_process(s.id) is None:
+                err = self.play_stream(s)
+                if err:
+                    return err
+            self.q.pin(s, self.cmd)
+            self.set_status(' Stream {0} pinned, it is restarted whenever its player exits'.format(s.name))
+        self.redraw_stream_footer()
+
     def _check_stream(self, url):
+        """ Returns (status, reason, qualities), reason being None unless the
+        check failed and qualities the quality names offered, best first,
+        None unless the stream is online """
         try:
             plugin = self.livestreamer.resolve_url(url)
+        except livestreamer.NoPluginError:
+            return 3, 'no plugin for this URL', None
+        try:
             avail_streams = plugin.get_streams()
-            if avail_streams:
-                return 1
-            return 0
-        except:
-            return 3
-
-    def check_online_streams(self):
-        self.all_streams_offline = True
-        self.set_status(' Checking online streams...')
+        except livestreamer.PluginError as e:
+            return 3, 'plugin error: {0}'.format(e), None
+        except Exception as e:
+            return 3, repr(e), None
+        if avail_streams:
+            return 1, None, sort_qualities(plugin, avail_streams)
+        return 0, None, None
+
+    def load_qualities(self):
+        """ Read the qualities seen by the last checks, of any instance """
+        qualities = self.store.get('qualities') or {}
+        for s in self.streams:
+            s.qualities = qualities.get(s.id, ())
+
+    def save_qualities(self):
+        """ Cache the qualities seen by checks, so that they are known
+        without a check on next start, and by the other instances """
+        self.store.set('qualities', dict((s.id, s.qualities) for s in self.streams if s.qualities))
+
+    def start_sweep(self, jobs):
+        """ Start checking jobs, a list of (key, url), in threads or in
+        worker processes depending on CHECK_ONLINE_BACKEND """
+        if self.config.CHECK_ONLINE_BACKEND == 'processes':
+            if self.check_pool is None:
+                self.check_pool = CheckPool(self._check_stream, self.config.CHECK_ONLINE_PROCESSES,
+                                            self.config.CHECK_ONLINE_WORKER_MAX_CHECKS,
+                                            self.config.CHECK_ONLINE_WORKER_MAX_RSS)
+            return self.check_pool.sweep(jobs, self.config.CHECK_ONLINE_TIMEOUT, self.breaker)
+        return CheckSweep(self._check_stream, jobs, self.config.CHECK_ONLINE_THREADS,
+                          self.config.CHECK_ONLINE_TIMEOUT, self.breaker)
+
+    def record_check(self, s, status, reason, qualities, reposition=True):
+        """ Keep the result of a check of stream s, as returned by a sweep
+
+        reposition : whether to move s to its place in the sort order, left
+                     to the caller when it sorts the list afterwards
 
-        done_queue   = queue.Queue()
+        """
+        moved = s.online != status
+        s['online'] = status
+        if moved and reposition:
+            self.reposition_stream(s, 'online')
+        if qualities:
+            s.qualities = qualities
+        if reason:
+            self.check_errors[s.id] = reason
+        else:
+            self.check_errors.pop(s.id, None)
+        if self.table:
+            self.table.update(s.id, online=status, last_check=time())
+
+    def check_in_background(self, streams, done):
+        """ Check streams without blocking the UI, done is called without
+        arguments once every result was recorded """
+        sweep = self.start_sweep([(s, s.url) for s in streams])
+        self.background_checks.append((sweep, done))
+
+    def poll_background_checks(self):
+        for check in list(self.background_checks):
+            sweep, done = check
+            results = sweep.poll()
+            if results:
+                # Results of streams deleted meanwhile are dropped
+                ids = set(s.id for s in self.streams)
+                # A batch is sorted at once rather than stream by stream
+                batch = len(results) > 1
+                for s, status, reason, qualities in results:
+                    if s.id in ids:
+                        self.record_check(s, status, reason, qualities, reposition=not batch)
+                if batch and 'online' in self.sort_fields:
+                    self.sort_streams()
+            # Wait for the stream list to be shown again before updating it
+            if sweep.done and self.current_pad == 'streams':
+                self.background_checks.remove(check)
+                done()
+
+    def check_online_streams(self, group=None):
+        """ Check all streams, or only those of group, ESC cancels the sweep
+
+        Each check is bounded by CHECK_ONLINE_TIMEOUT, and hosts failing
+        repeatedly are skipped for a while, see CircuitBreaker.
 
-        def check_stream_managed(args):
-            url, queue = args
-            status = self._check_stream(url)
-            done_queue.put(url)
-            return status
+        """
+        if group is None:
+            streams = self.streams
+            self.set_status(' Checking online streams...')
+        else:
+            streams = list(self.groups.get(group))
+            self.set_status(' Checking online streams in {0}...'.format(group))
 
-        pool = Pool(self.config.CHECK_ONLINE_THREADS)
-        args = [(s['url'], done_queue) for s in self.streams]
-        statuses = pool.map_async(check_stream_managed, args)
-        n_streams = len(self.streams)
+        sweep = self.start_sweep([(s, s.url) for s in streams])
+        n_streams = len(streams)
+        n_checked = 0
+        # Keys typed meanwhile, handled once the sweep is over
+        typed = []
+        pending = self.input_pending
 
-        while not statuses.ready():
-            sleep(0.1)
-            self.set_status(' Checked {0}/{1} streams...'.format(done_queue.qsize(), n_streams))
+        while True:
+            for s, status, reason, qualities in sweep.poll():
+                # Sorted once the sweep is over, see sweep_finished
+                self.record_check(s, status, reason, qualities, reposition=False)
+                n_checked += 1
+            if sweep.done:
+                break
+            self.set_status(' Checked {0}/{1} streams... (ESC to cancel)'.format(n_checked, n_streams))
             self.s.refresh()
+            try:
+                r = select.select([sys.stdin], [], [], 0.1)[0]
+            except select.error:
+                continue
+            if r:
+                keys = self.read_keys()
+                if 27 in keys:
+                    sweep.cancel()
+                typed.extend(c for c in keys if c != 27)
+
+        for c in reversed(typed):
+            curses.ungetch(c)
+        self.input_pending = pending or bool(typed)
+
+        self.sweep_finished(group)
+        if sweep.cancelled:
+            self.set_status(' Check cancelled, {0}/{1} streams checked'.format(n_checked, n_streams))
+
+    def sweep_finished(self, group=None):
+        """ Show and cache the results of a check of all streams, or of
+        those of group """
+        self.all_streams_offline = not any(s.online for s in self.streams)
+        if 'online' in self.sort_fields:
+            self.sort_streams()
+        self.refilter_streams()
+        if group is None:
+            self.last_autocheck = int(time())
+        else:
+            self.last_group_check[group] = int(time())
 
-        statuses = statuses.get()
-        for i, s in enumerate(self.streams):
-            s['online'] = statuses[i]
-            if s['online']:
-                self.all_streams_offline = False
+        # Cached for -l, which does not check streams itself
+        self.store.set('online', {
+            'time'   : int(time()),
+            'status' : dict((s.id, s.online) for s in self.streams)
+        })
+        self.save_qualities()
 
-        self.refilter_streams()
-        self.last_autocheck = int(time())
+        skipped = self.breaker.open_hosts()
+        if skipped:
+            self.set_status(' Skipping unreachable hosts: {0}'.format(', '.join(sorted(skipped))))
 
-        pool.close()
+    def prompt_input(self, prompt='', on_change=None):
+        """ Read a line of text on the status line
 
-    def prompt_input(self, prompt=''):
+        on_change : optional callable, called with the text after each edit.
+                    In that case ESC cancels and None is returned.
+
+        """
+        if on_change:
+            return self.prompt_live_input(prompt, on_change)
         self.s.move(self.max_y, 0)
         self.s.clrtoeol()
         self.s.addstr(prompt)
@@ -695,6 +1581,42 @@ class StreamList(object):
         self.s.clrtoeol()
         return r
 
+    def prompt_live_input(self, prompt, on_change):
+        text = ''
+        curses.curs_set(1)
+        while True:
+            self.s.move(self.max_y, 0)
+            self.s.clrtoeol()
+            self.s.addstr((prompt + text)[-self.max_x:])
+            self.s.refresh()
+            try:
+                c = self.s.get_wch() if PY3 else self.s.getch()
+            except curses.error:
+                continue
+            if not isinstance(c, int):
+                if ord(c) < 32 or ord(c) == 127:
+                    c = ord(c)
+            elif not PY3 and 32 <= c < 256:
+                c = chr(c)
+            if c in (10, 13, curses.KEY_ENTER):
+                break
+            elif c == 27: # ESC
+                text = None
+                break
+            elif c in (curses.KEY_BACKSPACE, 127, 8):
+                if not text:
+                    continue
+                text = text[:-1]
+            elif isinstance(c, int):
+                continue
+            else:
+                text += c
+            on_change(text)
+        curses.curs_set(0)
+        self.s.move(self.max_y, 0)
+        self.s.clrtoeol()
+        return text
+
     def prompt_confirmation(self, prompt='', def_yes=False):
         self.s.move(self.max_y-1, 0)
         self.s.clrtoeol()
@@ -717,9 +1639,39 @@ class StreamList(object):
         else:
             return def_yes
 
-    def sync_store(self):
-        self.store['streams'] = self.streams
-        self.store.sync()
+    def sync_store(self, stream):
+        """ Write a single stream to the database """
+        self.store.save_stream(stream.to_record())
+
+    def reload_streams(self):
+        """ Pick up changes written to the database by another process """
+        known = dict((s.id, s) for s in self.streams)
+        streams = []
+        for r in self.store.read():
+            new = Stream.from_record(r)
+            s = known.get(new.id)
+            if s:
+                # Keep the online status of known streams
+                for k in Stream.RECORD_FIELDS:
+                    s[k] = new[k]
+            else:
+                s = new
+            streams.append(s)
+        self.streams = streams
+        self.load_qualities()
+        self.groups = GroupIndex(self.streams)
+        # Forget the lines of the streams deleted by the other process
+        self.render_cache = dict((s.id, self.render_cache[s.id]) for s in streams
+                                 if s.id in self.render_cache)
+        if self.table:
+            self.table.sync(self.streams, dict((i, p.pid) for i, p in self.q.q.items()))
+        self.sort_streams()
+        self.no_streams = self.streams == []
+        row = self.pads['streams'].getyx()[0]
+        self.refilter_streams(quiet=True)
+        if not self.no_stream_shown:
+            self.move(min(row, len(self.filtered_streams)-1), absolute=True)
+        self.set_status(' Stream list reloaded, the database was changed by another process')
 
     def bump_stream(self, stream, throttle=False):
         t = int(time())
@@ -729,7 +1681,60 @@ class StreamList(object):
             return
         stream['seen'] += 1
         stream['last_seen'] = t
-        self.sync_store()
+        self.reposition_stream(stream, 'seen', 'last_seen')
+        self.sync_store(stream)
+
+    def sort_streams(self):
+        """ Fully sort the base list, only needed when the sort key changes
+        or when many streams change at once """
+        self.streams.sort(key=self.sort_key)
+
+    def reposition_stream(self, stream, *fields):
+        """ Move a single stream to its place in self.streams after some of
+        its fields changed
+
+        The list is already ordered so the stream only has to be shifted
+        past its neighbours, which is usually a few positions.
+
+        """
+        if not set(fields).intersection(self.sort_fields):
+            return
+        streams = self.streams
+        key = self.sort_key
+        try:
+            i = streams.index(stream)
+        except ValueError:
+            # Deleted meanwhile, e.g. while it was being checked
+            return
+        k = key(stream)
+        j = i
+        while j > 0 and key(streams[j-1]) > k:
+            j -= 1
+        if j == i:
+            while j < len(streams)-1 and key(streams[j+1]) < k:
+                j += 1
+        if j != i:
+            streams.insert(j, streams.pop(i))
+
+    def insert_stream(self, stream):
+        """ Insert a new stream at its place in self.streams """
+        key = self.sort_key
+        k = key(stream)
+        lo, hi = 0, len(self.streams)
+        while lo < hi:
+            mid = (lo+hi)//2
+            if k < key(self.streams[mid]):
+                hi = mid
+            else:
+                lo = mid+1
+        self.streams.insert(lo, stream)
+
+    def cycle_sort_key(self):
+        self.sort_index = (self.sort_index + 1) % len(SORT_KEYS)
+        self.sort_label, self.sort_key, self.sort_fields = SORT_KEYS[self.sort_index]
+        self.sort_streams()
+        self.refilter_streams(quiet=True)
+        self.set_status(' Sorted by {0}'.format(self.sort_label))
 
     def find_stream(self, sel, key='id'):
         for s in self.streams:
@@ -739,30 +1744,132 @@ class StreamList(object):
 
     def clear_filter(self):
         self.filter = ''
+        self.filter_rows = 0
         self.refilter_streams()
 
     def filter_streams(self):
-        self.filter = self.prompt_input('Filter: ').lower()
-        self.refilter_streams()
+        """ Prompt for a filter, the list is re-ranked as it is typed """
+        previous = self.filter
+        # Candidates for each prefix typed so far: adding a character can
+        # only narrow the matches down, deleting one goes back to the
+        # candidates of the shorter prefix
+        narrowed = [('', self.group_streams())]
+
+        def on_change(text):
+            query = text.lower()
+            while not query.startswith(narrowed[-1][0]):
+                narrowed.pop()
+            if query != narrowed[-1][0]:
+                narrowed.append((query, [s for s in narrowed[-1][1]
+                                         if is_subsequence(query, s.name.lower())
+                                         or is_subsequence(query, s.url.lower())]))
+            self.filter = query
+            self.filter_rows = 0
+            self.refilter_streams(quiet=True, candidates=narrowed[-1][1])
+
+        r = self.prompt_input('Filter: ', on_change=on_change)
+        if r is None:
+            self.filter = previous
+            self.refilter_streams()
+        else:
+            on_change(r)
+            self.refilter_streams(candidates=narrowed[-1][1])
 
-    def refilter_streams(self, quiet=False):
-        self.filtered_streams = []
-        for s in self.streams:
-            if ((self.show_offline_streams or s['online'] in [1,2])
-                and (self.filter in s['name'].lower() or self.filter in s['url'].lower())):
-                self.filtered_streams.append(s)
-        self.filtered_streams.sort(key=lambda s:s['seen'], reverse=True)
+    def refilter_streams(self, quiet=False, candidates=None):
+        """ Rebuild the list of shown streams
+
+        Without a filter, streams keep the order of self.streams, which is
+        kept sorted. With a filter, matches are ranked by fuzzy.stream_score
+        and only the best ones needed to fill the screen are picked, with a
+        bounded heap rather than a full sort.
+
+        candidates : streams to consider instead of all of the shown group,
+                     must include every match of the filter
+
+        """
+        if candidates is None:
+            candidates = self.group_streams()
+        shown = [s for s in candidates if self.show_offline_streams or s.online in [1,2]]
+        if self.filter:
+            now = time()
+            self.filter_matches = []
+            for s in shown:
+                score = stream_score(self.filter, s, now)
+                if score is not None:
+                    self.filter_matches.append((score, s))
+            limit = max(self.pad_h, self.filter_rows)
+            self.filtered_streams = [s for _, s in heapq.nlargest(limit, self.filter_matches,
+                                                                  key=itemgetter(0))]
+            n_matches = len(self.filter_matches)
+        else:
+            self.filter_matches = None
+            self.filtered_streams = shown
+            n_matches = len(shown)
         self.no_stream_shown = len(self.filtered_streams) == 0
         if not quiet:
-            self.status = ' Filter: {0} ({1}/{2} matches, {3} showing offline streams)'.format(
-                    self.filter or '<empty>', len(self.filtered_streams), len(self.streams),
+            if n_matches > len(self.filtered_streams):
+                best = ', best {0} shown'.format(len(self.filtered_streams))
+            else:
+                best = ''
+            if self.group is None:
+                group = ''
+            else:
+                group = ' Group: {0},'.format(self.group)
+            self.status = '{0} Filter: {1} ({2}/{3} matches{4}, {5} showing offline streams)'.format(
+                    group, self.filter or '<empty>', n_matches, len(self.streams), best,
                     '' if self.show_offline_streams else 'NOT')
         self.init_streams_pad()
         self.redraw_stream_footer()
         self.show_streams()
         self.redraw_status()
 
-    def add_stream(self, name, url, res=None, bump=False):
+    def group_streams(self):
+        """ Streams of the shown group, in the order of self.streams """
+        if self.group is None:
+            return self.streams
+        # self.streams is kept sorted, a pass over it is cheaper than sorting
+        # the group again each time the list is rebuilt
+        members = self.groups.get(self.group)
+        return [s for s in self.streams if s in members]
+
+    def show_group(self, group):
+        """ Show only the streams tagged with group, all of them if None """
+        self.group = group
+        self.filter_rows = 0
+        self.refilter_streams()
+
+    def prompt_group(self):
+        if not self.groups:
+            self.set_status(' No group yet, hit \'t\' to tag streams')
+            return
+        r = self.prompt_input('Group ({0}, empty for all): '.format(', '.join(self.groups.names())))
+        group = r.strip().lower() or None
+        if group is not None and group not in self.groups:
+            self.set_status(' No such group: {0}'.format(group))
+            return
+        self.show_group(group)
+
+    def cycle_group(self):
+        """ Show the next group, after the last one come all streams """
+        names = self.groups.names()
+        if self.group is None:
+            i = 0
+        else:
+            i = len([n for n in names if n <= self.group])
+        self.show_group(names[i] if i < len(names) else None)
+
+    def show_more_matches(self, rows):
+        """ Extend a truncated filtered list to at least rows streams """
+        if not self.filter_matches or len(self.filter_matches) <= len(self.filtered_streams):
+            return
+        row = self.pads['streams'].getyx()[0]
+        self.filter_rows = rows
+        self.filtered_streams = [s for _, s in heapq.nlargest(max(self.pad_h, rows), self.filter_matches,
+                                                              key=itemgetter(0))]
+        self.init_streams_pad(start_row=row)
+
+    def add_stream(self, name, url, res=None, bump=False, tags=None):
+        """ Add a stream unless its URL is known, returns the new stream """
         ex_stream = self.find_stream(url, key='url')
         if ex_stream:
             if bump:
@@ -773,17 +1880,12 @@ class StreamList(object):
                 last_seen = int(time())
             else:
                 seen = last_seen = 0
-            if not self.streams:
-                idf = 1
-            else:
-                self.max_id += 1
-                idf = self.max_id
 
             s_res = res or self.default_res
 
-            if type(s_res) == str:
+            if isinstance(s_res, (type(''), type(u''))):
                 actual_res = s_res
-            elif type(s_res) == dict:
+            elif isinstance(s_res, dict):
                 actual_res = DEFAULT_RESOLUTION_HARD
                 for k,v in s_res.items():
                     if k in url:
@@ -794,23 +1896,38 @@ class StreamList(object):
             else:
                 actual_res = DEFAULT_RESOLUTION_HARD
 
-            self.set_status(' Checking if new stream is online...')
-            self.s.refresh()
-            online = self._check_stream(url)
-
-            new_stream = {
-                    'id'        : idf,
-                    'name'      : name,
-                    'seen'      : seen,
-                    'last_seen' : last_seen,
-                    'res'       : actual_res,
-                    'url'       : url,
-                    'online'    : online
-                }
-            self.streams.append(new_stream)
+            # The id is allocated by the store, other instances may have
+            # added streams in the meantime
+            if tags is None:
+                # Added from a group view, keep it in the group
+                tags = () if self.group is None else (self.group,)
+            new_stream = Stream(None, name, url, actual_res, seen, last_seen, tags)
+            new_stream.id = self.store.save_stream(new_stream.to_record())[0]
+            self.insert_stream(new_stream)
+            self.groups.add(new_stream)
+            if self.table:
+                self.table.update(new_stream.id)
             self.no_streams = False
             self.refilter_streams()
-            self.sync_store()
+            self.set_status(' Checking if new stream is online...')
+            self.check_in_background([new_stream], lambda: self.new_stream_checked(new_stream))
+            return new_stream
+
+    def new_stream_checked(self, s):
+        """ Show the result of the check of a stream just added """
+        if s.qualities:
+            self.save_qualities()
+        row = self.pads['streams'].getyx()[0]
+        current = None if self.no_stream_shown else self.filtered_streams[row]
+        self.refilter_streams()
+        if current in self.filtered_streams:
+            # Follow the highlighted stream, it may have moved with the check
+            self.move(self.filtered_streams.index(current), absolute=True)
+        elif not self.no_stream_shown:
+            self.move(min(row, len(self.filtered_streams)-1), absolute=True)
+        if s.qualities and playable_res(s) != s.res:
+            self.set_status(' {0} is not offered by this stream, hit \'r\' to choose among {1}'.format(
+                s.res, ', '.join(s.qualities)))
 
     def delete_stream(self):
         if self.no_streams:
@@ -821,8 +1938,13 @@ class StreamList(object):
             return
         self.filtered_streams.remove(s)
         self.streams.remove(s)
+        self.groups.remove(s)
+        self.q.unpin(s.id)
+        self.render_cache.pop(s.id, None)
+        if self.table:
+            self.table.remove(s.id)
         pad.deleteln()
-        self.sync_store()
+        self.store.delete_stream(s.id)
         if not self.streams:
             self.no_streams = True
         if not self.filtered_streams:
@@ -842,8 +1964,9 @@ class StreamList(object):
             return
         s['seen']      = 0
         s['last_seen'] = 0
+        self.reposition_stream(s, 'seen', 'last_seen')
         self.redraw_current_line()
-        self.sync_store()
+        self.sync_store(s)
 
     def edit_stream(self, attr):
         prompt_info = {
@@ -858,12 +1981,175 @@ class StreamList(object):
         new_val = self.prompt_input('{0} (empty to cancel): '.format(prompt_info[attr]))
         if new_val != '':
             s[attr] = new_val
+            self.reposition_stream(s, attr)
+            self.sync_store(s)
             self.redraw_current_line()
         self.redraw_status()
         self.redraw_stream_footer()
 
+    def edit_resolution(self):
+        """ Pick the resolution among the qualities seen by the last check,
+        or type one in if the stream was not seen online yet """
+        if self.no_stream_shown:
+            return
+        pad = self.pads[self.current_pad]
+        s = self.filtered_streams[pad.getyx()[0]]
+        if not s.qualities:
+            return self.edit_stream('res')
+        choices = list(s.qualities) + list(QUALITY_ALIASES)
+        self.set_footer(' '.join('{0}:{1}'.format(i+1, q) for i, q in enumerate(choices))[:self.max_x])
+        new_val = self.prompt_input('Resolution (number or name, empty to cancel): ').strip()
+        if new_val.isdigit() and 1 <= int(new_val) <= len(choices):
+            new_val = choices[int(new_val)-1]
+        if new_val != '':
+            s['res'] = new_val
+            self.sync_store(s)
+            self.redraw_current_line()
+        self.redraw_status()
+        self.redraw_stream_footer()
+
+    def edit_tags(self):
+        if self.no_stream_shown:
+            return
+        pad = self.pads[self.current_pad]
+        s = self.filtered_streams[pad.getyx()[0]]
+        new_val = self.prompt_input('Tags (space separated, - to remove all, empty to cancel): ')
+        if new_val != '':
+            old_tags = s.tags
+            if new_val.strip() == '-':
+                s.tags = ()
+            else:
+                s.tags = parse_tags(new_val)
+            self.groups.retag(s, old_tags)
+            self.sync_store(s)
+            if self.group is not None and self.group not in s.tags:
+                # The stream leaves the group shown
+                self.refilter_streams(quiet=True)
+            else:
+                self.redraw_current_line()
+        self.redraw_status()
+        self.redraw_stream_footer()
+
+    def get_rc_stat(self):
+        if not self.rc_filename:
+            return None
+        try:
+            st = os.stat(self.rc_filename)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def check_rc_file(self):
+        """ Reload the rc file if it changed since it was last read """
+        rc_stat = self.get_rc_stat()
+        if rc_stat == self.rc_stat:
+            return
+        # Remember it even if loading fails, so it is only tried once per edit
+        self.rc_stat = rc_stat
+        if rc_stat is None:
+            return
+        try:
+            new_config = load_rc(self.rc_filename)
+            err = self.apply_config(new_config)
+        except Exception as e:
+            self.set_status(' Failed to reload rc file, keeping the current settings: {0}'.format(e))
+            return
+        if err:
+            self.set_status(' Reloaded {0}, {1}'.format(self.rc_filename, err))
+        else:
+            self.set_status(' Reloaded {0}'.format(self.rc_filename))
+
+    def apply_config(self, config):
+        """ Switch to a new config module, validated first so that nothing
+        changes if it is faulty
+
+        Returns an error message if the status table or the control socket
+        could not be opened again, the other settings are applied anyway.
+
+        """
+        cmd_list = validate_config(config)
+        old = self.config
+        self.config = config
+
+        # Keep the same command line selected if it is still there
+        current = str(self.cmd)
+        self.cmd_index = 0
+        for i, cmd in enumerate(cmd_list):
+            if str(cmd) == current:
+                self.cmd_index = i
+                break
+        self.cmd_list = cmd_list
+        self.cmd = cmd_list[self.cmd_index]
+
+        self.default_res = config.DEFAULT_RESOLUTION
+
+        # Checks use CHECK_ONLINE_THREADS workers from the next sweep on
+        if config.CHECK_ONLINE_TIMEOUT > 0:
+            self.livestreamer.set_option('http-timeout', config.CHECK_ONLINE_TIMEOUT)
+        self.breaker.threshold = config.CHECK_ONLINE_BREAKER_THRESHOLD
+        self.breaker.cooldown  = config.CHECK_ONLINE_BREAKER_COOLDOWN
+        self.configure_supervision()
+        if self.check_pool:
+            # Workers beyond the new size are retired as they finish
+            self.check_pool.size       = config.CHECK_ONLINE_PROCESSES
+            self.check_pool.max_checks = config.CHECK_ONLINE_WORKER_MAX_CHECKS
+            self.check_pool.max_rss    = config.CHECK_ONLINE_WORKER_MAX_RSS
+            if (config.CHECK_ONLINE_BACKEND != 'processes' and not self.restart_sweep
+                and not self.background_checks):
+                self.check_pool.close()
+                self.check_pool = None
+
+        if config.INDICATORS != old.INDICATORS:
+            self.render_cache = {}
+            self.redraw_indicators()
+
+        if config.CHECK_ONLINE_INTERVAL != old.CHECK_ONLINE_INTERVAL:
+            # The run loop compares last_autocheck with the new interval
+            if config.CHECK_ONLINE_INTERVAL > 0:
+                # Right away if no check was made yet or one is overdue
+                next_check = max(self.last_autocheck + config.CHECK_ONLINE_INTERVAL, time())
+                self.set_footer('Next check at {0}'.format(strftime('%H:%M:%S', localtime(next_check))))
+
+        if not config.HISTORY_ENABLED:
+            self.history = None
+        elif self.history:
+            self.history.max_size = config.HISTORY_MAX_SIZE
+            self.history.backups  = config.HISTORY_BACKUPS
+        else:
+            # Streams already playing are not recorded
+            self.history = History(self.store.filename + '.history', config.HISTORY_MAX_SIZE,
+                                   config.HISTORY_BACKUPS)
+        self.q.history = self.history
+
+        errors = []
+        if config.STATUS_TABLE != old.STATUS_TABLE:
+            errors.append(self.open_status_table())
+        if config.CONTROL_SOCKET != old.CONTROL_SOCKET:
+            errors.append(self.open_control_socket())
+        return ', '.join(e for e in errors if e) or None
+
+    def redraw_indicators(self):
+        """ Redraw only the status column of the stream list """
+        pad = self.pads['streams']
+        cursor = pad.getyx()[0]
+        for i, s in enumerate(self.filtered_streams):
+            if self.q.get_process(s.id) is not None:
+                indicator = self.config.INDICATORS[4] # playing
+            else:
+                indicator = self.config.INDICATORS[s.online]
+            if i == cursor:
+                attr = curses.A_REVERSE
+            else:
+                attr = curses.A_NORMAL
+            pad.move(i, PLAYING_FIELD_OFFSET)
+            pad.clrtoeol()
+            pad.addstr(i, PLAYING_FIELD_OFFSET, indicator[:self.pad_w-PLAYING_FIELD_OFFSET-1], attr)
+        pad.move(cursor, 0)
+        if self.current_pad == 'streams':
+            self.refresh_current_pad()
+
     def show_commandline(self):
-        self.set_footer('{0}/{1} {2}'.format(self.cmd_index+1, len(self.cmd_list), ' '.join(self.cmd)))
+        self.set_footer('{0}/{1} {2}'.format(self.cmd_index+1, len(self.cmd_list), self.cmd))
 
     def shift_commandline(self):
         self.cmd_index += 1
@@ -876,35 +2162,128 @@ class StreamList(object):
         url = self.prompt_input('New stream URL (empty to cancel): ')
         name = url.split('/')[-1]
         if name:
-            self.add_stream(name, url)
-            self.move(len(self.filtered_streams)-1, absolute=True, refresh=False)
+            s = self.add_stream(name, url) or self.find_stream(url, key='url')
+            # Inserted at its place in the sort order
+            if s in self.filtered_streams:
+                self.move(self.filtered_streams.index(s), absolute=True, refresh=False)
             self.show_streams()
 
-    def play_stream(self):
-        if self.no_stream_shown:
-            return
-        pad = self.pads[self.current_pad]
-        s = self.filtered_streams[pad.getyx()[0]]
+    def play_stream(self, s=None):
+        """ Play the highlighted stream, or s if given
+
+        Returns an error message if the stream could not be started
+
+        """
+        if s is None:
+            if self.no_stream_shown:
+                return
+            pad = self.pads[self.current_pad]
+            s = self.filtered_streams[pad.getyx()[0]]
+        err = None
         try:
             self.q.put(s, self.cmd)
             self.bump_stream(s, throttle=True)
-            self.redraw_current_line()
-            self.refresh_current_pad()
-        except Exception as e:
-            if type(e) == QueueDuplicate:
-                self.set_footer('This stream is already playing')
-            elif type(e) == OSError:
-                self.set_footer('/!\ Faulty command line: {0}'.format(e.strerror))
-            else:
-                raise e
+            self.redraw_stream(s)
+            res = playable_res(s)
+            if res != s.res:
+                self.set_footer('{0} is not offered by this stream, playing {1}'.format(s.res, res))
+        except QueueDuplicate:
+            err = 'This stream is already playing'
+        except QueueFull:
+            err = 'Too many streams are already playing'
+        except OSError as e:
+            err = '/!\ Faulty command line: {0}'.format(e.strerror)
+        if err:
+            self.set_footer(err)
+        return err
+
+    def stop_stream(self, s=None):
+        """ Stop the highlighted stream, or s if given
+
+        Returns the terminated process, None if the stream was not playing
 
-    def stop_stream(self):
-        if self.no_stream_shown:
-            return
-        pad = self.pads[self.current_pad]
-        s = self.filtered_streams[pad.getyx()[0]]
+        """
+        if s is None:
+            if self.no_stream_shown:
+                return
+            pad = self.pads[self.current_pad]
+            s = self.filtered_streams[pad.getyx()[0]]
         p = self.q.terminate_process(s['id'])
         if p:
-            self.redraw_current_line()
+            self.redraw_stream(s)
             self.redraw_stream_footer()
             self.redraw_status()
+        return p
+
+    def stream_info(self, s):
+        """ JSON serializable description of a stream """
+        info = s.to_dict()
+        info['playing'] = self.q.get_process(s.id) is not None
+        info['pinned']  = self.q.is_pinned(s.id)
+        return info
+
+    def control_request(self, method, params):
+        """ Handle a request received on the control socket """
+        if method == 'list':
+            if 'group' in params:
+                members = self.groups.get(params['group'])
+                streams = [s for s in self.streams if s in members]
+            else:
+                streams = self.streams
+            return [self.stream_info(s) for s in streams]
+        elif method == 'status':
+            return {
+                'streams'    : len(self.streams),
+                'shown'      : len(self.filtered_streams),
+                'playing'    : sorted(self.q.q.keys()),
+                'command'    : str(self.cmd),
+                'filter'     : self.filter,
+                'group'      : self.group,
+                'groups'     : self.groups.names(),
+                'last_check' : self.last_autocheck
+            }
+        elif method == 'check':
+            group = params.get('group')
+            if group is not None and group not in self.groups:
+                raise ControlError('No such group')
+            # 'list' shows the results as they come in, 'last_check' of
+            # 'status' changes once a check of all streams is done
+            streams = self.streams if group is None else list(self.groups.get(group))
+            self.check_in_background(streams, lambda: self.sweep_finished(group))
+            return {'checking': True}
+        elif method == 'add':
+            url = params.get('url')
+            if not url:
+                raise ControlError('Missing "url" parameter')
+            name = params.get('name') or url.split('/')[-1]
+            tags = params.get('tags')
+            if tags is not None:
+                tags = parse_tags(' '.join(tags))
+            new_stream = self.add_stream(name, url, res=params.get('res'), tags=tags)
+            info = self.stream_info(new_stream or self.find_stream(url, key='url'))
+            # A new stream is checked in the background
+            info['checking'] = new_stream is not None
+            return info
+        elif method in ('play', 'stop', 'pin', 'unpin'):
+            for key in ('id', 'url', 'name'):
+                if key in params:
+                    s = self.find_stream(params[key], key=key)
+                    break
+            else:
+                raise ControlError('One of "id", "url" or "name" is required')
+            if not s:
+                raise ControlError('No such stream')
+            if method == 'play':
+                err = self.play_stream(s)
+                if err:
+                    raise ControlError(err)
+            elif method in ('pin', 'unpin'):
+                if self.q.is_pinned(s.id) != (method == 'unpin'):
+                    raise ControlError('This stream is already {0}ned'.format(method))
+                err = self.toggle_pin(s)
+                if err:
+                    raise ControlError(err)
+            elif not self.stop_stream(s):
+                raise ControlError('This stream is not playing')
+            return self.stream_info(s)
+        raise ControlError('Unknown method: {0}'.format(method))